@@ -0,0 +1,415 @@
+import os
+import ast
+import cv2
+import numpy as np
+from alpr.utils import get_logger
+
+logger = get_logger("BACKENDS")
+
+
+class DetectionResult:
+    """
+    Boxes detected on one image, in the coordinates of that image.
+    """
+    def __init__(self, boxes, confidences, classes):
+        """
+        Args:
+            boxes (np.array): (N, 4) float32 boxes as (x1, y1, x2, y2).
+            confidences (np.array): (N,) detection confidences.
+            classes (np.array): (N,) class indices.
+        """
+        self.boxes = boxes
+        self.confidences = confidences
+        self.classes = classes
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, int))
+
+
+class DetectorBackend:
+    """
+    Runs a YOLO detector and returns DetectionResults, whatever the inference engine.
+
+    Attributes:
+        names (dict): Mapping from class index to class name.
+    """
+    names = {}
+
+    def predict(self, images, confidence=0.25, iou=0.7):
+        """
+        Detect objects on a batch of images.
+
+        Args:
+            images (list[np.array]): Images in BGR format.
+            confidence (float): Minimum detection confidence.
+            iou (float): IoU threshold used for non-maximum suppression.
+
+        Returns:
+            list[DetectionResult]: One result per image, in input order.
+        """
+        raise NotImplementedError
+
+
+class UltralyticsBackend(DetectorBackend):
+    """
+    PyTorch weights run through ultralytics, the reference implementation.
+    """
+    def __init__(self, model_path):
+        from ultralytics import YOLO
+
+        self.model = YOLO(model_path)
+        self.names = self.model.names
+
+    def predict(self, images, confidence=0.25, iou=0.7):
+        results = self.model.predict(source=list(images), conf=confidence, iou=iou, verbose=False)
+        return [
+            DetectionResult(
+                result.boxes.xyxy.cpu().numpy(),
+                result.boxes.conf.cpu().numpy(),
+                result.boxes.cls.cpu().numpy().astype(int),
+            )
+            for result in results
+        ]
+
+
+def letterbox(image, size, color=(114, 114, 114)):
+    """
+    Resize keeping the aspect ratio and pad to size, centred, as ultralytics does.
+
+    Args:
+        image (np.array): Image in BGR format.
+        size (tuple): Network input size as (height, width).
+
+    Returns:
+        tuple: (padded image, gain, (left pad, top pad))
+    """
+    height, width = image.shape[:2]
+    gain = min(size[0] / height, size[1] / width)
+    new_width, new_height = int(round(width * gain)), int(round(height * gain))
+    pad_w, pad_h = (size[1] - new_width) / 2, (size[0] - new_height) / 2
+    if (width, height) != (new_width, new_height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    padded = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return padded, gain, (left, top)
+
+
+def to_blob(images):
+    """
+    Stack letterboxed BGR images into a float32 NCHW RGB blob in [0, 1].
+    """
+    batch = np.stack(images)[..., ::-1].transpose(0, 3, 1, 2)
+    return np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+
+def non_max_suppression(boxes, scores, classes, iou, max_detections=300):
+    """
+    Class-aware NMS: boxes of different classes are offset so they never overlap, as in
+    ultralytics.
+
+    Returns:
+        np.array: Indices of the kept boxes, by decreasing score.
+    """
+    offset = boxes + (classes[:, None] * 7680.0)
+    x1, y1, x2, y2 = offset.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size and len(keep) < max_detections:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        width = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        height = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        overlap = width * height / (areas[best] + areas[rest] - width * height + 1e-9)
+        order = rest[overlap <= iou]
+    return np.asarray(keep, dtype=int)
+
+
+def decode_output(output, confidence, iou, gain, pad, image_shape):
+    """
+    Turn one raw YOLOv8/11 output, (4 + classes, anchors) with centre-size boxes and class
+    scores, into a DetectionResult in original image coordinates.
+    """
+    predictions = output.T
+    scores_per_class = predictions[:, 4:]
+    classes = scores_per_class.argmax(axis=1)
+    scores = scores_per_class[np.arange(len(classes)), classes]
+    mask = scores > confidence
+    if not mask.any():
+        return DetectionResult.empty()
+
+    centre_size, scores, classes = predictions[mask, :4], scores[mask], classes[mask]
+    boxes = np.empty_like(centre_size)
+    boxes[:, :2] = centre_size[:, :2] - centre_size[:, 2:] / 2
+    boxes[:, 2:] = centre_size[:, :2] + centre_size[:, 2:] / 2
+
+    keep = non_max_suppression(boxes, scores, classes, iou)
+    boxes, scores, classes = boxes[keep], scores[keep], classes[keep]
+
+    # Undo the letterbox
+    boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad[0]) / gain
+    boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad[1]) / gain
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, image_shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, image_shape[0])
+    return DetectionResult(boxes.astype(np.float32), scores.astype(np.float32), classes.astype(int))
+
+
+def parse_names(value):
+    """
+    Class names as stored in exported model metadata: a dict, or its string representation.
+    """
+    if isinstance(value, str):
+        value = ast.literal_eval(value)
+    return {int(k): v for k, v in value.items()}
+
+
+def read_metadata_names(model_path):
+    """
+    Class names from the metadata.yaml ultralytics writes next to exported models, if any.
+    """
+    directory = model_path if os.path.isdir(model_path) else os.path.dirname(model_path)
+    path = os.path.join(directory, "metadata.yaml")
+    if not os.path.exists(path):
+        return None
+    import yaml
+
+    with open(path) as f:
+        return parse_names(yaml.safe_load(f)["names"])
+
+
+class ExportedModelBackend(DetectorBackend):
+    """
+    Shared pre- and post-processing of the exported (ONNX / OpenVINO) backends: letterbox,
+    raw forward pass, box decoding and NMS, matching ultralytics.
+    """
+    input_size = (640, 640)
+    fixed_batch = 1
+
+    def forward(self, blob):
+        raise NotImplementedError
+
+    def predict(self, images, confidence=0.25, iou=0.7):
+        letterboxed = [letterbox(image, self.input_size) for image in images]
+        outputs = []
+        step = max(self.fixed_batch or len(images), 1)
+        for start in range(0, len(images), step):
+            chunk = [padded for padded, _, _ in letterboxed[start:start + step]]
+            count = len(chunk)
+            if self.fixed_batch:
+                # Models exported with a static batch size get zero images as filler
+                chunk += [np.zeros_like(chunk[0])] * (self.fixed_batch - count)
+            outputs.extend(self.forward(to_blob(chunk))[:count])
+        return [
+            decode_output(output, confidence, iou, gain, pad, image.shape)
+            for output, (_, gain, pad), image in zip(outputs, letterboxed, images)
+        ]
+
+
+class OnnxRuntimeBackend(ExportedModelBackend):
+    """
+    ONNX models, FP32 or INT8-quantized, run on the CPU through ONNX Runtime.
+    """
+    def __init__(self, model_path, names=None, threads=None):
+        """
+        Args:
+            model_path (str): Path to the .onnx model.
+            names (dict, optional): Class names, read from the model metadata by default.
+            threads (int, optional): Intra-op threads, ONNX Runtime's default if None.
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch, _, height, width = model_input.shape
+        self.input_size = (height, width) if isinstance(height, int) else (640, 640)
+        self.fixed_batch = batch if isinstance(batch, int) else None
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = names or (parse_names(metadata["names"]) if "names" in metadata else read_metadata_names(model_path))
+        if self.names is None:
+            raise ValueError(f"{model_path} has no class names, pass them with names=.")
+
+    def forward(self, blob):
+        return list(self.session.run(None, {self.input_name: blob})[0])
+
+
+class OpenVINOBackend(ExportedModelBackend):
+    """
+    OpenVINO IR (.xml) or ONNX models, FP32 or INT8, compiled for the CPU.
+    """
+    def __init__(self, model_path, names=None, threads=None):
+        """
+        Args:
+            model_path (str): Path to the .xml (or .onnx) model, or the export directory.
+            names (dict, optional): Class names, read from metadata.yaml by default.
+            threads (int, optional): Inference threads, OpenVINO's default if None.
+        """
+        import openvino as ov
+
+        if os.path.isdir(model_path):
+            model_path = next(
+                os.path.join(model_path, f) for f in sorted(os.listdir(model_path)) if f.endswith(".xml")
+            )
+        core = ov.Core()
+        model = core.read_model(model_path)
+        shape = model.inputs[0].get_partial_shape()
+        if shape[2].is_static and shape[3].is_static:
+            self.input_size = (shape[2].get_length(), shape[3].get_length())
+        self.fixed_batch = shape[0].get_length() if shape[0].is_static else None
+        config = {"INFERENCE_NUM_THREADS": threads} if threads else {}
+        self.compiled = core.compile_model(model, "CPU", config)
+        self.output = self.compiled.output(0)
+
+        self.names = names or read_metadata_names(model_path)
+        if self.names is None:
+            raise ValueError(f"{model_path} has no metadata.yaml with class names, pass them with names=.")
+
+    def forward(self, blob):
+        return list(self.compiled(blob)[self.output])
+
+
+def available_backend(model_path):
+    """
+    Pick the backend for a model file: ultralytics for .pt weights, OpenVINO for IR models,
+    ONNX Runtime (or OpenVINO if it is missing) for .onnx models.
+    """
+    if model_path.endswith(".xml") or model_path.endswith("_openvino_model") or os.path.isdir(model_path):
+        return "openvino"
+    if model_path.endswith(".onnx"):
+        try:
+            import onnxruntime  # noqa: F401
+            return "onnxruntime"
+        except ImportError:
+            return "openvino"
+    return "ultralytics"
+
+
+def create_backend(model_path, backend="auto", names=None, threads=None):
+    """
+    Create the detector backend for a model.
+
+    Args:
+        model_path (str): Path to the model: .pt, .onnx, .xml or an OpenVINO export directory.
+        backend (str): "auto", "ultralytics", "onnxruntime" or "openvino".
+        names (dict, optional): Class names for exported models without metadata.
+        threads (int, optional): CPU threads for the exported backends.
+
+    Returns:
+        DetectorBackend: The backend with the model loaded.
+    """
+    if backend == "auto":
+        backend = available_backend(model_path)
+    logger.info("Loading %s with the %s backend.", model_path, backend)
+    if backend == "ultralytics":
+        return UltralyticsBackend(model_path)
+    if backend == "onnxruntime":
+        return OnnxRuntimeBackend(model_path, names, threads)
+    if backend == "openvino":
+        return OpenVINOBackend(model_path, names, threads)
+    raise ValueError(f"Unknown detector backend {backend}.")
+
+
+def quantize_onnx(model_path, output_path, calibration_images, input_size=(640, 640)):
+    """
+    Write an INT8 (QDQ) version of an ONNX detector, calibrated on representative images.
+
+    Args:
+        model_path (str): Path to the FP32 .onnx model.
+        output_path (str): Path of the quantized model.
+        calibration_images (list[np.array]): Images in BGR format, e.g. a hundred frames.
+        input_size (tuple): Network input size as (height, width).
+    """
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    input_name = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class LetterboxReader(CalibrationDataReader):
+        def __init__(self):
+            self.blobs = iter(to_blob([letterbox(image, input_size)[0]]) for image in calibration_images)
+
+        def get_next(self):
+            blob = next(self.blobs, None)
+            return None if blob is None else {input_name: blob}
+
+    quantize_static(
+        model_path,
+        output_path,
+        LetterboxReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+    logger.info("Wrote INT8 model %s.", output_path)
+
+
+def box_iou(a, b):
+    """
+    Pairwise IoU between two sets of (x1, y1, x2, y2) boxes.
+    """
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return intersection / (area_a[:, None] + area_b[None, :] - intersection + 1e-9)
+
+
+def parity_check(reference, candidate, images, confidence=0.25, iou=0.7, match_iou=0.9):
+    """
+    Compare a backend against the reference (typically the ultralytics PyTorch path).
+
+    Every reference box is matched to the candidate box of the same class with the highest
+    IoU. The candidate is in parity when every box is matched above match_iou.
+
+    Args:
+        reference (DetectorBackend): Reference backend.
+        candidate (DetectorBackend): Backend under test.
+        images (list[np.array]): Images in BGR format.
+        confidence (float): Detection confidence used by both backends.
+        iou (float): NMS IoU threshold used by both backends.
+        match_iou (float): IoU above which two boxes are the same detection.
+
+    Returns:
+        dict: Matched, missed and extra box counts, the lowest matched IoU, the largest
+              confidence difference, and whether the backends are in parity.
+    """
+    report = {"images": len(images), "reference_boxes": 0, "matched": 0, "missed": 0, "extra": 0,
+              "min_iou": None, "max_confidence_delta": 0.0}
+    ious = []
+    for expected, actual in zip(reference.predict(images, confidence, iou), candidate.predict(images, confidence, iou)):
+        report["reference_boxes"] += len(expected)
+        used = set()
+        if len(expected) and len(actual):
+            overlaps = box_iou(expected.boxes, actual.boxes)
+            overlaps[expected.classes[:, None] != actual.classes[None, :]] = 0
+        for i in range(len(expected)):
+            best = None
+            if len(actual):
+                candidates = [j for j in np.argsort(-overlaps[i]) if j not in used]
+                best = candidates[0] if candidates and overlaps[i, candidates[0]] >= match_iou else None
+            if best is None:
+                report["missed"] += 1
+                continue
+            used.add(best)
+            report["matched"] += 1
+            ious.append(float(overlaps[i, best]))
+            report["max_confidence_delta"] = max(
+                report["max_confidence_delta"], abs(float(expected.confidences[i] - actual.confidences[best]))
+            )
+        report["extra"] += len(actual) - len(used)
+
+    report["min_iou"] = min(ious) if ious else None
+    report["parity"] = report["missed"] == 0 and report["extra"] == 0
+    return report
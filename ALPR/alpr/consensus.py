@@ -0,0 +1,81 @@
+from collections import defaultdict
+from alpr.utils import get_logger
+
+logger = get_logger("CONSENSUS")
+
+
+class PlateConsensus:
+    """
+    Combine the license plate reads of every candidate (padded crops, rectifications and
+    zoom levels) into a single answer.
+
+    Candidates vote for a plate length first, then for the character at each position of
+    that length, weighted by their confidence. The consensus is settled once enough
+    candidates have been seen and the winning read reaches the agreement threshold, so
+    callers can stop scheduling further candidates.
+    """
+    def __init__(self, agreement_threshold=0.6, min_candidates=3):
+        """
+        Args:
+            agreement_threshold (float): Confidence, in [0, 1], at which the read is settled.
+            min_candidates (int): Number of non-empty reads required before settling.
+        """
+        self.agreement_threshold = agreement_threshold
+        self.min_candidates = min_candidates
+        self.candidates = []
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def add(self, license_plate, confidence=1.0):
+        """
+        Record the read of one candidate. Empty reads are ignored.
+
+        Args:
+            license_plate (str): The plate string read from the candidate.
+            confidence (float): Weight of the read, typically its mean character confidence.
+        """
+        if license_plate:
+            self.candidates.append((license_plate, max(float(confidence), 1e-6)))
+
+    def vote(self):
+        """
+        Vote on the plate length, then on each character position.
+
+        Returns:
+            tuple: (winning license plate or None, confidence score in [0, 1])
+        """
+        if not self.candidates:
+            return None, 0.0
+
+        length_weights = defaultdict(float)
+        for plate, weight in self.candidates:
+            length_weights[len(plate)] += weight
+        total_weight = sum(length_weights.values())
+        length = max(length_weights, key=length_weights.get)
+        group = [(plate, weight) for plate, weight in self.candidates if len(plate) == length]
+
+        characters = []
+        position_agreement = 1.0
+        for position in range(length):
+            votes = defaultdict(float)
+            for plate, weight in group:
+                votes[plate[position]] += weight
+            character = max(votes, key=votes.get)
+            characters.append(character)
+            position_agreement = min(position_agreement, votes[character] / length_weights[length])
+
+        confidence = (length_weights[length] / total_weight) * position_agreement
+        return "".join(characters), confidence
+
+    def is_settled(self):
+        """
+        Whether enough candidates agree that evaluating more of them is unnecessary.
+        """
+        if len(self.candidates) < self.min_candidates:
+            return False
+        license_plate, confidence = self.vote()
+        if confidence >= self.agreement_threshold:
+            logger.info("Settled on %s (%.2f) after %d candidates.", license_plate, confidence, len(self.candidates))
+            return True
+        return False
@@ -0,0 +1,149 @@
+import time
+import cv2
+from collections import defaultdict, deque
+from alpr.utils import log
+
+
+def dhash(image, hash_size=8):
+    """
+    Difference hash of an image: compares neighbouring pixels of a tiny grayscale version,
+    so small changes in lighting or sensor noise flip only a few bits.
+
+    Args:
+        image (np.ndarray): BGR or grayscale image.
+        hash_size (int): Side of the hash grid, the hash has hash_size ** 2 bits.
+
+    Returns:
+        int: The hash.
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def dhash_file(image_path, hash_size=8, region=None):
+    """
+    Difference hash of an image file, decoded at a quarter of its resolution to keep it cheap.
+
+    Args:
+        image_path (str): Path of the image.
+        hash_size (int): Side of the hash grid.
+        region (CameraRegion, optional): Only hash the camera's detection region. Most of a
+                                         fixed camera's frame is background, which keeps the
+                                         whole-frame hashes of two different cars close.
+
+    Returns:
+        int: The hash, or None if the file could not be read.
+    """
+    image = cv2.imread(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        return None
+    if region is not None:
+        x1, y1, x2, y2 = region.bounds(image.shape, scale=0.25)
+        image = image[y1:y2, x1:x2]
+    return dhash(image, hash_size)
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class FrameDeduplicator:
+    """
+    Skip frames that look like a recent frame from the same camera, before any model runs.
+
+    The capture firmware fires again every cooldown while a vehicle stays in front of the
+    sensor, producing a stream of near identical frames. A frame whose perceptual hash is
+    within max_distance bits of a frame processed in the last window_seconds is a duplicate.
+
+    A match does not refresh the remembered frame, so a scene is suppressed for at most
+    window_seconds after it was processed: a parked car is read again once per window, and
+    the EventDeduplicator collapses those reads, while a different car hashing close to it
+    is never hidden for longer than that.
+    """
+    def __init__(self, max_distance=6, window_seconds=60.0, history=8):
+        """
+        Args:
+            max_distance (int): Maximum Hamming distance, out of 64 bits, for a duplicate.
+            window_seconds (float): How long a frame is remembered.
+            history (int): Number of recent frames remembered per camera.
+        """
+        self.max_distance = max_distance
+        self.window_seconds = window_seconds
+        self.recent = defaultdict(lambda: deque(maxlen=history))
+        self.frames_seen = 0
+        self.frames_skipped = 0
+
+    def is_duplicate(self, frame_hash, camera_id=1, timestamp=None):
+        """
+        Check a frame against the recent frames of its camera, and remember it if it is new.
+
+        Args:
+            frame_hash (int): Perceptual hash of the frame, see dhash().
+            camera_id (int): Camera that captured the frame.
+            timestamp (float, optional): Capture time, defaults to now.
+
+        Returns:
+            bool: True if the frame can be skipped.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        recent = self.recent[camera_id]
+        while recent and timestamp - recent[0][0] > self.window_seconds:
+            recent.popleft()
+
+        self.frames_seen += 1
+        for _, seen_hash in recent:
+            if hamming_distance(frame_hash, seen_hash) <= self.max_distance:
+                self.frames_skipped += 1
+                return True
+        recent.append((timestamp, frame_hash))
+        return False
+
+
+class EventDeduplicator:
+    """
+    Collapse identical plate reads from the same camera within a time window, so a car that
+    is read several times produces one OccupancyEvent.
+    """
+    def __init__(self, window_seconds=300.0):
+        """
+        Args:
+            window_seconds (float): Reads of the same plate closer than this are collapsed.
+        """
+        self.window_seconds = window_seconds
+        self.last_seen = {}
+        self.events_seen = 0
+        self.events_suppressed = 0
+
+    def should_write(self, license_plate, camera_id=1, timestamp=None):
+        """
+        Decide whether a read becomes a new event. Every read, written or not, extends the
+        window of its plate.
+
+        Returns:
+            bool: False if the same plate was read by this camera within the window.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        key = (camera_id, license_plate)
+        previous = self.last_seen.get(key)
+        self.last_seen[key] = timestamp
+        self.events_seen += 1
+
+        if previous is not None and timestamp - previous <= self.window_seconds:
+            self.events_suppressed += 1
+            return False
+
+        # Forget plates that left, so the dictionary does not grow forever
+        if len(self.last_seen) > 1000:
+            self.last_seen = {k: t for k, t in self.last_seen.items() if timestamp - t <= self.window_seconds}
+        return True
+
+
+def log_dedupe_stats(frames, events):
+    """
+    Log how many frames and events the deduplicators saved.
+    """
+    log("DEDUPE", f"Skipped {frames.frames_skipped}/{frames.frames_seen} frames, "
+                  f"suppressed {events.events_suppressed}/{events.events_seen} events.")
@@ -0,0 +1,387 @@
+import os
+import json
+import time
+import shutil
+
+# Time spent importing the pipeline modules, reported with the rest of the startup
+_import_started = time.perf_counter()
+
+import cv2
+import numpy as np
+from alpr.localisation import Localisation
+from alpr.rectification import Rectification
+from alpr.segmentation import Segmentation
+from alpr.upscaler import Upscaler
+from alpr import metrics
+from alpr.utils import get_logger, test_manager
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
+logger = get_logger("ENGINE")
+
+
+def load_engine_config(config_path):
+    """
+    Read the ALPREngine keyword arguments stored in a JSON config file.
+    """
+    with open(config_path) as f:
+        config = json.load(f)
+    return config.get("engine", config)
+
+
+class ALPRResult:
+    """
+    Outcome of running the ALPR pipeline on a single image.
+    """
+    def __init__(self, license_plate, image_path=None, confidence=None, candidates=0):
+        """
+        Args:
+            license_plate (str or None): The recognized license plate, None if nothing was read.
+            image_path (str, optional): Path of the image that was processed.
+            confidence (float, optional): Agreement score of the candidates on the read.
+            candidates (int): Number of candidates that produced a read.
+        """
+        self.license_plate = license_plate
+        self.image_path = image_path
+        self.confidence = confidence
+        self.candidates = candidates
+
+    def __bool__(self):
+        return bool(self.license_plate)
+
+    def __repr__(self):
+        return (f"ALPRResult(license_plate={self.license_plate!r}, confidence={self.confidence!r}, "
+                f"candidates={self.candidates}, image_path={self.image_path!r})")
+
+
+class ALPREngine:
+    """
+    A long-lived ALPR pipeline that loads every model once and reuses it for each image.
+
+    Constructing the Upscaler, Localisation, Rectification and Segmentation stages reloads
+    the YOLO weights and the LapSRN network, which costs more than the inference itself on
+    small devices. Create a single engine per process and call recognize() for every image.
+    """
+    def __init__(self,
+                 localisation_model,
+                 segmentation_model,
+                 sr_model,
+                 cropped_paddings=[-5, -10, 0, 10, 20],
+                 segmentation_padding_levels=[-5, -2, 0, 5, 10, 20],
+                 power_level=3,
+                 output_dir="./output",
+                 session_number=0,
+                 in_memory=True,
+                 candidate_batch_size=5,
+                 early_exit=True,
+                 agreement_threshold=0.6,
+                 min_agreeing_candidates=3,
+                 rectification_workers=1,
+                 rectification_top_k=1,
+                 rectification_first_match=False,
+                 adaptive_upscaling=True,
+                 detector_backend="auto",
+                 camera_regions=None,
+                 warm_up=True,
+                 startup_budget=None):
+        """
+        Load all the models used by the pipeline.
+
+        Args:
+            localisation_model (str): Path to the localisation YOLO model: PyTorch weights, or an
+                                      ONNX / OpenVINO export for the CPU backends.
+            segmentation_model (str): Path to the segmentation YOLO model, in the same formats.
+            sr_model (str): Path to the super resolution model.
+            cropped_paddings (list[int]): Padding levels used when cropping detected plates.
+            segmentation_padding_levels (list[int]): Zoom levels at which the characters are
+                                                     cropped from each candidate.
+            power_level (int): Rectification threshold level, from 0 (7 thresholds) to 3 (14).
+            output_dir (str): Root directory for the intermediate outputs.
+            session_number (int): Identifier for the processing session.
+            in_memory (bool): Pass crops, rectified plates and character segments between the
+                              stages as arrays instead of writing them to output_dir.
+            candidate_batch_size (int): Number of candidates segmented together before the
+                                        consensus is checked again.
+            early_exit (bool): Stop scheduling candidates once the consensus is settled.
+            agreement_threshold (float): Consensus confidence at which the read is settled.
+            min_agreeing_candidates (int): Reads required before the consensus can settle.
+            rectification_workers (int): Threads used for the rectification contour search.
+            rectification_top_k (int): Best scoring rectifications passed on per crop.
+            rectification_first_match (bool): Stop the contour search at the first element
+                                              yielding a 4-corner contour, see Rectification.
+            adaptive_upscaling (bool): Only run super-resolution on inputs smaller than needed.
+            detector_backend (str): "auto" (by model file type), "ultralytics", "onnxruntime"
+                                    or "openvino", see alpr.backends.
+            camera_regions (dict, optional): Per camera detection region and width, e.g.
+                                             {"1": {"roi": [0, 0.4, 1, 1], "detection_width": 640}}.
+                                             See alpr.localisation.CameraRegion.
+            warm_up (bool): Whether to run a dummy inference through every model after loading.
+            startup_budget (float, optional): Seconds the startup may take before a warning is
+                                              logged, see report_startup().
+        """
+        self.cropped_paddings = cropped_paddings
+        self.in_memory = in_memory
+        self.candidate_batch_size = candidate_batch_size
+        self.early_exit = early_exit
+        self.cropped_dir = os.path.join(output_dir, "cropped", f"session_{session_number}")
+        self.rectified_dir = os.path.join(output_dir, "rectified", f"session_{session_number}")
+        self.segmented_dir = os.path.join(output_dir, "segmented", f"session_{session_number}")
+
+        logger.info("Loading models.")
+        self.startup = {"import": IMPORT_SECONDS}
+        self.tm = test_manager()
+
+        # The inference frameworks are imported by the first model needing them, so their
+        # import time is counted in that model's load time
+        start = time.perf_counter()
+        self.upscaler = Upscaler(sr_model, adaptive=adaptive_upscaling)
+        self.startup["load_super_resolution"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.localiser = Localisation(localisation_model, detector_backend, camera_regions)
+        self.startup["load_localisation"] = time.perf_counter() - start
+        self.rectifier = Rectification(
+            self.upscaler,
+            self.tm,
+            power_level=power_level,
+            workers=rectification_workers,
+            top_k=rectification_top_k,
+            first_match=rectification_first_match,
+        )
+        start = time.perf_counter()
+        self.segmenter = Segmentation(
+            segmentation_model,
+            self.upscaler,
+            padding_levels=segmentation_padding_levels,
+            agreement_threshold=agreement_threshold,
+            min_agreeing_candidates=min_agreeing_candidates,
+            backend=detector_backend,
+        )
+        self.startup["load_segmentation"] = time.perf_counter() - start
+        self.startup["model_load"] = sum(
+            self.startup[name] for name in ("load_super_resolution", "load_localisation", "load_segmentation")
+        )
+        logger.info("Models loaded.")
+
+        start = time.perf_counter()
+        if warm_up:
+            self.warm_up()
+        self.startup["warm_up"] = time.perf_counter() - start
+        self.startup["total"] = self.startup["import"] + self.startup["model_load"] + self.startup["warm_up"]
+        self.report_startup(startup_budget)
+
+    @classmethod
+    def from_config(cls, config_path, **overrides):
+        """
+        Create an engine from a JSON config file, such as the ones written by
+        benchmarks/autotune.py.
+
+        Args:
+            config_path (str): Path to the config. It holds ALPREngine keyword arguments, at
+                               the top level or under an "engine" key.
+            **overrides: Keyword arguments taking precedence over the file, e.g. model paths.
+
+        Returns:
+            ALPREngine: The engine with the models loaded.
+        """
+        return cls(**dict(load_engine_config(config_path), **overrides))
+
+    def warm_up(self):
+        """
+        Run a dummy inference through every model so the first real image does not pay
+        for lazy initialisation (graph building, memory allocation, fusing layers).
+        """
+        blank_plate = np.zeros((32, 64, 3), dtype=np.uint8)
+        self.upscaler.upsample_batch([blank_plate])
+        self.localiser.detector.predict([np.zeros((640, 640, 3), dtype=np.uint8)])
+        self.segmenter.detector.predict(
+            [np.zeros((self.segmenter.input_height, self.segmenter.input_width, 3), dtype=np.uint8)]
+        )
+        logger.info("Models warmed up.")
+
+    def report_startup(self, budget=None):
+        """
+        Log the startup breakdown (import, model load, warm-up) and export it as the
+        alpr_startup_seconds gauge, warning when the total exceeds the budget.
+
+        Run `python -X importtime demo/alpr_top.py 2> imports.log` to see which modules
+        make up the import time.
+
+        Args:
+            budget (float, optional): Seconds the startup is expected to take at most.
+        """
+        for phase, seconds in self.startup.items():
+            metrics.set_gauge("alpr_startup_seconds", seconds, "Engine startup time by phase.", phase=phase)
+        logger.info("Startup took %.2fs: import %.2fs, model load %.2fs "
+                    "(super-resolution %.2fs, localisation %.2fs, segmentation %.2fs), warm-up %.2fs.",
+                    self.startup["total"], self.startup["import"], self.startup["model_load"],
+                    self.startup["load_super_resolution"], self.startup["load_localisation"],
+                    self.startup["load_segmentation"], self.startup["warm_up"])
+        if budget is not None and self.startup["total"] > budget:
+            logger.warning("Startup took %.2fs, over the %.2fs budget.", self.startup["total"], budget)
+
+    def close(self):
+        """
+        Release the threads started by the stages. Call it once the engine is no longer used.
+        """
+        self.rectifier.close()
+
+    def clear_outputs(self):
+        """
+        Remove the intermediate outputs written while processing an image.
+        """
+        for folder in (self.cropped_dir, self.rectified_dir, self.segmented_dir):
+            if os.path.isdir(folder):
+                shutil.rmtree(folder, ignore_errors=True)
+            os.makedirs(folder, exist_ok=True)
+
+    def load_image(self, image):
+        """
+        Accept either a path or an already decoded BGR image.
+        """
+        if isinstance(image, np.ndarray):
+            return image
+        decoded = cv2.imread(image)
+        if decoded is None:
+            logger.warning("%s does not contain an image.", image)
+            raise ValueError("Image path invalid or image format not supported.")
+        return decoded
+
+    def recognize(self, image, camera_id=None):
+        """
+        Run the full pipeline on a single image.
+
+        Args:
+            image (str or np.array): Path to the input image, or the decoded image in BGR format.
+                                     Arrays are only accepted in in-memory mode.
+            camera_id (int, optional): Camera that captured the image, selecting its detection
+                                       region when camera_regions is set.
+
+        Returns:
+            ALPRResult: The recognized license plate for the image.
+        """
+        image_path = image if isinstance(image, str) else None
+        self.segmenter.reset()
+        with metrics.stage_timer("frame"):
+            if self.in_memory:
+                self.recognize_in_memory(self.load_image(image), camera_id)
+            else:
+                self.recognize_from_disk(image, camera_id)
+        return self.consensus_result(image_path)
+
+    def recognize_batch(self, images, camera_ids=None):
+        """
+        Run the pipeline on several images, detecting the plates of all of them in one
+        localisation call. Used by the model server to batch frames across cameras.
+
+        The later stages stop as soon as each image's consensus settles, so they still run
+        image by image. In file mode the images are simply recognized one after the other.
+
+        Args:
+            images (list): Paths or decoded BGR images.
+            camera_ids (list, optional): Camera of each image.
+
+        Returns:
+            list[ALPRResult]: One result per image, in input order.
+        """
+        camera_ids = camera_ids or [None] * len(images)
+        if not self.in_memory:
+            return [self.recognize(image, camera_id) for image, camera_id in zip(images, camera_ids)]
+
+        decoded = [self.load_image(image) for image in images]
+        crops_per_image = self.localiser.crop_plates_batch(decoded, self.cropped_paddings, camera_ids=camera_ids)
+        results = []
+        for image, crops in zip(images, crops_per_image):
+            self.segmenter.reset()
+            with metrics.stage_timer("frame"):
+                self.read_crops(crops)
+            results.append(self.consensus_result(image if isinstance(image, str) else None))
+        return results
+
+    def consensus_result(self, image_path=None):
+        """
+        Turn the consensus of the frame just processed into an ALPRResult.
+        """
+        license_plate, confidence = self.segmenter.consensus.vote()
+        metrics.observe("alpr_candidates_per_frame", len(self.segmenter.consensus),
+                        "Plate candidates read before the consensus settled.")
+        metrics.count("alpr_frames_total", "Frames processed.", result="read" if license_plate else "unread")
+        logger.info("Consensus read %s with confidence %.2f.", license_plate, confidence)
+        return ALPRResult(license_plate, image_path, confidence, len(self.segmenter.consensus))
+
+    def plate_candidates(self, crops):
+        """
+        Yield (cache key, image) for the padded crops first, then their rectifications.
+
+        Rectification is only run when the consumer asks for more candidates, so it is
+        skipped entirely once the consensus settles on the crops alone.
+        """
+        for plate_idx, padding, crop in crops:
+            yield (plate_idx, padding), crop
+        # --- Rectification: Straighten each cropped license plate image ---
+        for plate_idx, padding, crop in crops:
+            for rectified in self.rectifier.rectify_arrays([crop], [(plate_idx, padding)]):
+                yield None, rectified
+
+    def recognize_in_memory(self, image, camera_id=None):
+        """
+        Run the pipeline keeping every intermediate result as an array.
+        """
+        # --- Localisation: Crop license plates from the input image ---
+        crops = self.localiser.crop_plates(image, self.cropped_paddings, camera_id=camera_id)
+        self.read_crops(crops)
+
+    def read_crops(self, crops):
+        """
+        Rectify and segment the plate crops of one frame until the consensus settles.
+        """
+        logger.debug("Cropped %d license plate candidates.", len(crops))
+        self.rectifier.set_directories(None, None)
+
+        try:
+            # --- Segmentation : Segment each character, in batches, until the reads agree ---
+            keys, batch = [], []
+            for key, candidate in self.plate_candidates(crops):
+                keys.append(key)
+                batch.append(candidate)
+                if len(batch) < self.candidate_batch_size:
+                    continue
+                self.segmenter.segment_arrays(batch, keys)
+                keys, batch = [], []
+                if self.early_exit and self.segmenter.consensus.is_settled():
+                    logger.debug("Consensus reached, skipping the remaining candidates.")
+                    return
+            if batch:
+                self.segmenter.segment_arrays(batch, keys)
+        finally:
+            # The super-resolution outputs are only shared within this frame
+            self.upscaler.end_frame()
+
+    def recognize_from_disk(self, image_path, camera_id=None):
+        """
+        Run the pipeline with the stages exchanging JPEG files through output_dir.
+        """
+        self.clear_outputs()
+        try:
+            # --- Localisation: Crop license plates from the input image ---
+            logger.info("Beginning localisation for input image at %s", image_path)
+            self.localiser.set_directories(image_path, self.cropped_dir)
+            cropped_directories = self.localiser.crop_license_plate(
+                padding_levels=self.cropped_paddings,
+                camera_id=camera_id,
+            )
+            logger.debug("Cropped Directories: %s", cropped_directories)
+
+            # --- Rectification: Straighten each cropped license plate image ---
+            self.rectifier.set_directories(cropped_directories, self.rectified_dir)
+            self.rectifier.rectify()
+
+            # --- Segmentation : Segment each character ---
+            self.segmenter.set_directories(
+                cropped_dir=cropped_directories,
+                rectified_dir=self.rectified_dir,
+                output_dir=self.segmented_dir,
+            )
+            self.segmenter.segment()
+        finally:
+            self.clear_outputs()
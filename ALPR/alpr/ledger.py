@@ -0,0 +1,156 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from alpr.utils import log
+
+
+def hash_file(path, chunk_size=1 << 16):
+    """
+    Return the BLAKE2b digest of a file's contents as a hex string.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ProcessedLedger:
+    """
+    Persistent record of the images that were already processed, stored in SQLite.
+
+    Images are keyed by the hash of their contents, so a file seen before is skipped even
+    if it was renamed or copied again, and the ledger survives restarts of the service.
+    The file name, size and modification time are kept too, so that on a restart the files
+    left untouched are recognised without reading them (contains_unchanged()). Entries older
+    than the retention period are compacted away periodically.
+    """
+    def __init__(self, db_path="./output/processed.db", retention_seconds=7 * 24 * 3600, compact_every=500):
+        """
+        Args:
+            db_path (str): Path of the SQLite database, created if missing.
+            retention_seconds (float): Age after which an entry is removed by compact().
+            compact_every (int): Number of recorded images between automatic compactions.
+        """
+        self.db_path = db_path
+        self.retention_seconds = retention_seconds
+        self.compact_every = compact_every
+        self.recorded = 0
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        # WAL keeps the ledger consistent if the process dies mid-write
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS processed (
+                content_hash TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                processed_at REAL NOT NULL,
+                license_plate TEXT,
+                size INTEGER,
+                mtime REAL
+            );
+            CREATE INDEX IF NOT EXISTS processed_filename ON processed (filename);
+            CREATE INDEX IF NOT EXISTS processed_at ON processed (processed_at);
+        """)
+        self.connection.commit()
+        log("LEDGER", f"Opened {db_path} with {len(self)} processed images.")
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM processed").fetchone()[0]
+
+    def contains(self, image_path, content_hash=None):
+        """
+        Whether an image with the same contents was already processed.
+
+        Args:
+            image_path (str): Path of the image.
+            content_hash (str, optional): Precomputed hash of the image, see hash_file().
+
+        Returns:
+            bool: True if the image should be skipped.
+        """
+        content_hash = content_hash or hash_file(image_path)
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM processed WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+        return row is not None
+
+    def contains_unchanged(self, image_path):
+        """
+        Whether this file, with the same name, size and modification time, was already
+        processed. Only the file's metadata is read, so checking the files left over from
+        before a restart costs no hashing; call contains() on a miss.
+
+        Args:
+            image_path (str): Path of the image.
+
+        Returns:
+            bool: True if the image should be skipped.
+        """
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return False
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM processed WHERE filename = ? AND size = ? AND mtime = ? LIMIT 1",
+                (os.path.basename(image_path), stat.st_size, stat.st_mtime),
+            ).fetchone()
+        return row is not None
+
+    def record(self, image_path, license_plate=None, content_hash=None):
+        """
+        Mark an image as processed.
+
+        Args:
+            image_path (str): Path of the image.
+            license_plate (str, optional): The plate read from the image, kept for reference.
+            content_hash (str, optional): Precomputed hash of the image, see hash_file().
+        """
+        content_hash = content_hash or hash_file(image_path)
+        try:
+            stat = os.stat(image_path)
+            size, mtime = stat.st_size, stat.st_mtime
+        except OSError:
+            # Already deleted, it can only be matched by its hash
+            size, mtime = None, None
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO processed "
+                "(content_hash, filename, processed_at, license_plate, size, mtime) VALUES (?, ?, ?, ?, ?, ?)",
+                (content_hash, os.path.basename(image_path), time.time(), license_plate, size, mtime),
+            )
+            self.connection.commit()
+            self.recorded += 1
+        if self.compact_every and self.recorded % self.compact_every == 0:
+            self.compact()
+
+    def compact(self, max_age=None):
+        """
+        Remove the entries older than max_age seconds, the retention period by default.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        cutoff = time.time() - (self.retention_seconds if max_age is None else max_age)
+        with self.lock:
+            removed = self.connection.execute(
+                "DELETE FROM processed WHERE processed_at < ?", (cutoff,)
+            ).rowcount
+            self.connection.commit()
+        if removed:
+            log("LEDGER", f"Compacted {removed} entries older than the retention period.")
+        return removed
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
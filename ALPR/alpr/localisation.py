@@ -1,21 +1,231 @@
 import os
 import cv2
 import numpy as np
-from ultralytics import YOLO
-from alpr.utils import log,add_bp 
+from alpr import metrics
+from alpr.backends import create_backend
+from alpr.utils import get_logger, add_bp
+
+logger = get_logger("LOCALISATION")
+
+
+class CameraRegion:
+    """
+    The part of a camera's frame where plates can appear, and the width it is detected at.
+
+    Fixed cameras usually see plates in a band of the frame only (a lane, a gate). Running the
+    detector on that band alone, downscaled, skips the sky and the walls, and the boxes are
+    mapped back to the full resolution frame so the plates are still cropped sharp.
+    """
+    def __init__(self, roi=None, detection_width=None):
+        """
+        Args:
+            roi (tuple, optional): (x1, y1, x2, y2) of the region. Values all within [0, 1] are
+                                   fractions of the frame size, otherwise pixels. None keeps
+                                   the whole frame.
+            detection_width (int, optional): Width the region is downscaled to before detection.
+                                             Regions narrower than this are left as they are.
+        """
+        if roi is not None and len(roi) != 4:
+            raise ValueError(f"roi must be (x1, y1, x2, y2), got {roi}.")
+        self.roi = tuple(roi) if roi is not None else None
+        self.detection_width = detection_width
+
+    @classmethod
+    def from_dict(cls, settings):
+        return cls(settings.get("roi"), settings.get("detection_width"))
+
+    def bounds(self, shape, scale=1.0):
+        """
+        Pixel bounds (x1, y1, x2, y2) of the region in a frame of the given shape.
+
+        Args:
+            shape (tuple): Shape of the frame.
+            scale (float): Size of the frame relative to the camera's full resolution, for
+                           frames decoded at a reduced size. Only pixel ROIs depend on it.
+        """
+        height, width = shape[:2]
+        if self.roi is None:
+            return 0, 0, width, height
+        x1, y1, x2, y2 = self.roi
+        if all(0 <= value <= 1 for value in self.roi):
+            x1, x2 = x1 * width, x2 * width
+            y1, y2 = y1 * height, y2 * height
+        else:
+            x1, y1, x2, y2 = x1 * scale, y1 * scale, x2 * scale, y2 * scale
+        x1, x2 = int(np.clip(x1, 0, width)), int(np.clip(x2, 0, width))
+        y1, y2 = int(np.clip(y1, 0, height)), int(np.clip(y2, 0, height))
+        if x2 <= x1 or y2 <= y1:
+            raise ValueError(f"roi {self.roi} is empty for a {width}x{height} frame.")
+        return x1, y1, x2, y2
+
+    def prepare(self, image):
+        """
+        Crop and downscale a frame for detection.
+
+        Returns:
+            tuple: (detection image, scale, (x offset, y offset)), where a pixel of the detection
+                   image maps to offset + pixel / scale in the frame.
+        """
+        x1, y1, x2, y2 = self.bounds(image.shape)
+        region = image[y1:y2, x1:x2]
+        scale = 1.0
+        if self.detection_width and region.shape[1] > self.detection_width:
+            scale = self.detection_width / region.shape[1]
+            size = (self.detection_width, max(int(round(region.shape[0] * scale)), 1))
+            region = cv2.resize(region, size, interpolation=cv2.INTER_AREA)
+        return region, scale, (x1, y1)
+
+    @staticmethod
+    def to_frame(boxes, scale, offset):
+        """
+        Map (x1, y1, x2, y2) boxes found on the detection image back to frame coordinates.
+        """
+        x, y = offset
+        return [np.asarray(box, dtype=np.float32) / scale + (x, y, x, y) for box in boxes]
+
+
+def load_camera_regions(camera_regions):
+    """
+    Build the CameraRegions from their settings.
+
+    Args:
+        camera_regions (dict, optional): Camera id to {"roi": ..., "detection_width": ...}.
+
+    Returns:
+        dict: Camera id, as a string, to CameraRegion.
+    """
+    return {str(camera_id): CameraRegion.from_dict(settings) for camera_id, settings in (camera_regions or {}).items()}
+
+
+def find_region(regions, camera_id=None):
+    """
+    The region of a camera, falling back to the "default" entry, or None for the whole frame.
+    """
+    region = regions.get(str(camera_id)) if camera_id is not None else None
+    return region or regions.get("default")
+
 
 class Localisation:
-    def __init__(self, model_path):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path, backend="auto", camera_regions=None):
+        """
+        Args:
+            model_path (str): Path to the localisation model (.pt, .onnx or OpenVINO).
+            backend (str): Detector backend, see alpr.backends.create_backend.
+            camera_regions (dict, optional): Camera id to {"roi": ..., "detection_width": ...},
+                                             see CameraRegion. A "default" entry applies to
+                                             the cameras without their own.
+        """
+        self.backend = backend
+        self.detector = create_backend(model_path, backend)
+        self.regions = load_camera_regions(camera_regions)
 
     def replace_model(self, model_path):
-        self.model = YOLO(model_path)
+        self.detector = create_backend(model_path, self.backend)
 
     def set_directories(self, input_, output_dir):
         self.image_path = input_
         self.output_dir = output_dir
 
-    def crop_license_plate(self, padding_levels=[20], confidence=0.25, iou=0.45):
+    def set_region(self, camera_id, roi=None, detection_width=None):
+        """
+        Restrict the detection on a camera's frames to a region, at a reduced width.
+
+        Args:
+            camera_id (int or str): ID of the camera, or "default" for every other camera.
+            roi (tuple, optional): (x1, y1, x2, y2) in pixels or frame fractions.
+            detection_width (int, optional): Width the region is downscaled to for detection.
+        """
+        self.regions[str(camera_id)] = CameraRegion(roi, detection_width)
+
+    def region_for(self, camera_id=None):
+        return find_region(self.regions, camera_id)
+
+    def detect_plates(self, image, confidence=0.25, iou=0.45, camera_id=None):
+        """
+        Run the localisation model on an in-memory image.
+
+        Args:
+            image (np.array): Input image in BGR format.
+            confidence (float): Minimum detection confidence.
+            iou (float): IoU threshold used for non-maximum suppression.
+            camera_id (int, optional): Camera that captured the image, selecting its region.
+
+        Returns:
+            list[np.array]: Bounding boxes as (x1, y1, x2, y2) in the coordinates of the full
+                            image, one per detected plate.
+        """
+        return self.detect_plates_batch([image], confidence, iou, [camera_id])[0]
+
+    def detect_plates_batch(self, images, confidence=0.25, iou=0.45, camera_ids=None):
+        """
+        Run the localisation model once on several in-memory images, e.g. frames of
+        different cameras.
+
+        Args:
+            images (list[np.array]): Input images in BGR format.
+            confidence (float): Minimum detection confidence.
+            iou (float): IoU threshold used for non-maximum suppression.
+            camera_ids (list, optional): Camera of each image, selecting its region.
+
+        Returns:
+            list[list[np.array]]: The bounding boxes of each image, in input order.
+        """
+        camera_ids = camera_ids or [None] * len(images)
+        regions = [self.region_for(camera_id) for camera_id in camera_ids]
+        with metrics.stage_timer("localisation"):
+            prepared = [
+                (image, 1.0, (0, 0)) if region is None else region.prepare(image)
+                for image, region in zip(images, regions)
+            ]
+            results = self.detector.predict([detection_image for detection_image, _, _ in prepared], confidence, iou)
+            detections = [
+                CameraRegion.to_frame(result.boxes, scale, offset) if region is not None else list(result.boxes)
+                for result, region, (_, scale, offset) in zip(results, regions, prepared)
+            ]
+        for boxes in detections:
+            metrics.observe("alpr_plates_per_frame", len(boxes), "License plates detected per frame.")
+            logger.info("Number of license plates detected - %d.", len(boxes))
+        return detections
+
+    def crop_plates(self, image, padding_levels=[20], confidence=0.25, iou=0.45, camera_id=None):
+        """
+        Detect license plates and crop them at every padding level without touching the disk.
+
+        The crops are views into the input image, so the caller must not modify them in place
+        if the frame is reused.
+
+        Args:
+            image (np.array): Input image in BGR format.
+            padding_levels (list[int]): Margins, in pixels, added around each detected plate.
+            confidence (float): Minimum detection confidence.
+            iou (float): IoU threshold used for non-maximum suppression.
+            camera_id (int, optional): Camera that captured the image, selecting its region.
+                                       The crops always come from the full resolution image.
+
+        Returns:
+            list[tuple]: (plate index, padding, crop) for every plate and padding level.
+        """
+        return self.crop_plates_batch([image], padding_levels, confidence, iou, [camera_id])[0]
+
+    def crop_plates_batch(self, images, padding_levels=[20], confidence=0.25, iou=0.45, camera_ids=None):
+        """
+        Batched crop_plates(): the plates of every image are detected in one model call.
+
+        Returns:
+            list[list[tuple]]: The (plate index, padding, crop) tuples of each image, in input order.
+        """
+        crops_per_image = []
+        for image, boxes in zip(images, self.detect_plates_batch(images, confidence, iou, camera_ids)):
+            crops = []
+            for idx, box in enumerate(boxes):
+                x1, y1, x2, y2 = map(int, box)
+                for padding in padding_levels:
+                    crop = image[max(y1 - padding, 0):y2 + padding, max(x1 - padding, 0):x2 + padding]
+                    crops.append((idx, padding, crop))
+            crops_per_image.append(crops)
+        return crops_per_image
+
+    def crop_license_plate(self, padding_levels=[20], confidence=0.25, iou=0.45, camera_id=None):
         """
         The licence plate detection can be filtered using two variables:
             confidence & iou
@@ -28,30 +238,17 @@ class Localisation:
 
         image = cv2.imread(self.image_path)
         if image is None:
-            log("LOCALISATION", f"{self.image_path} does not contain an image.")
+            logger.warning("%s does not contain an image.", self.image_path)
             raise ValueError("Image path invalid or image format not supported.")
 
-        results = self.model.predict(source=self.image_path, conf=confidence, iou=iou)
-    
-        log("LOCALISATION", f"Cropped Image successfully, number of license plates detected - {len(results)}.")
         cropped_directories = []
-        for result in results:
-            boxes = result.boxes.xyxy.cpu().numpy()
-            for idx, box in enumerate(boxes):
-                for padding in padding_levels:
-
-                    specific_crop_dir = os.path.join(self.output_dir, f"crop_{padding}")
-                    os.makedirs(specific_crop_dir , exist_ok=True)
-                    
-                    x1, y1, x2, y2 = map(int, box)
-                    x1, y1 = max(x1 - padding, 0), max(y1 - padding, 0)
-                    x2, y2 = x2 + padding, y2 + padding
-
-                    crop = image[y1:y2, x1:x2]
+        for _, padding, crop in self.crop_plates(image, padding_levels, confidence, iou, camera_id):
+            specific_crop_dir = os.path.join(self.output_dir, f"crop_{padding}")
+            os.makedirs(specific_crop_dir , exist_ok=True)
 
-                    crop_filename = os.path.join(specific_crop_dir, f"crop.jpg")
-                    cv2.imwrite(crop_filename, crop)
-                    cropped_directories.append(specific_crop_dir)
-                    log("LOCALISATION", f"Saved image {crop_filename} in directory {specific_crop_dir}.")
+            crop_filename = os.path.join(specific_crop_dir, f"crop.jpg")
+            cv2.imwrite(crop_filename, crop)
+            cropped_directories.append(specific_crop_dir)
+            logger.debug("Saved image %s in directory %s.", crop_filename, specific_crop_dir)
 
         return cropped_directories
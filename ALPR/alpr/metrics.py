@@ -0,0 +1,325 @@
+import os
+import json
+import time
+import bisect
+import threading
+
+# Latency buckets in seconds, from a fast OCR batch to a slow full frame
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+class Counter:
+    """
+    Monotonically increasing value.
+    """
+    type_name = "counter"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    """
+    Value that can go up and down, e.g. a queue depth.
+    """
+    type_name = "gauge"
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    """
+    Distribution of observed values in fixed buckets, as in Prometheus: each observation
+    costs one binary search and an increment.
+    """
+    type_name = "histogram"
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.lock = threading.Lock()
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        """
+        Estimate a quantile by linear interpolation inside its bucket.
+        """
+        with self.lock:
+            counts, count = list(self.counts), self.count
+        if count == 0:
+            return None
+        rank = q * count
+        cumulative = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def snapshot(self):
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, buckets = 0, {}
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            buckets["+Inf" if bound == float("inf") else repr(bound)] = cumulative
+        return {
+            "count": count,
+            "sum": total,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": buckets,
+        }
+
+
+class Timer:
+    """
+    Context manager observing the elapsed time of its block in a histogram.
+    """
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Holds every metric of the process and exports them as Prometheus text or JSON.
+
+    Metrics are grouped in families sharing a name, help text and type; each set of labels
+    is its own series. Looking a series up is a dictionary access, and recording a value a
+    lock and an addition, so instrumentation can stay on in production.
+    """
+    def __init__(self, enabled=True, constant_labels=None):
+        """
+        Args:
+            enabled (bool): Whether the module-level helpers record anything.
+            constant_labels (dict, optional): Labels added to every exported Prometheus series,
+                                              e.g. the worker id in a multi-process pool.
+        """
+        self.enabled = enabled
+        self.constant_labels = dict(constant_labels or {})
+        self.lock = threading.Lock()
+        self.families = {}
+
+    def get(self, metric_type, name, help_text, labels, **kwargs):
+        key = tuple(sorted(labels.items()))
+        family = self.families.get(name)
+        if family is None or key not in family["series"]:
+            with self.lock:
+                family = self.families.setdefault(
+                    name, {"type": metric_type.type_name, "help": help_text, "series": {}}
+                )
+                if key not in family["series"]:
+                    family["series"][key] = metric_type(**kwargs)
+        return family["series"][key]
+
+    def counter(self, name, help_text="", **labels):
+        return self.get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text="", **labels):
+        return self.get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text="", buckets=LATENCY_BUCKETS, **labels):
+        return self.get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def timer(self, name, help_text="", **labels):
+        return Timer(self.histogram(name, help_text, **labels))
+
+    def reset(self):
+        with self.lock:
+            self.families = {}
+
+    def to_json(self):
+        """
+        Snapshot of every series, with p50/p95 estimates for the histograms.
+        """
+        snapshot = {}
+        for name, family in list(self.families.items()):
+            snapshot[name] = {
+                "type": family["type"],
+                "help": family["help"],
+                "series": [
+                    {"labels": dict(key), "value": metric.snapshot()}
+                    for key, metric in list(family["series"].items())
+                ],
+            }
+        return snapshot
+
+    def to_prometheus(self):
+        """
+        Every series in the Prometheus text exposition format.
+        """
+        lines = []
+        for name, family in sorted(self.families.items()):
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            for key, metric in sorted(family["series"].items()):
+                labels = [f'{label}="{value}"' for label, value in key + tuple(self.constant_labels.items())]
+                if family["type"] != "histogram":
+                    lines.append(f"{name}{format_labels(labels)} {metric.snapshot()}")
+                    continue
+                snapshot = metric.snapshot()
+                for bound, cumulative in snapshot["buckets"].items():
+                    bucket_labels = format_labels(labels + ['le="%s"' % bound])
+                    lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {snapshot['sum']}")
+                lines.append(f"{name}_count{format_labels(labels)} {snapshot['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """
+        Write the Prometheus text file atomically, e.g. for the node exporter textfile collector.
+        """
+        write_atomically(path, self.to_prometheus())
+
+    def write_json(self, path):
+        write_atomically(path, json.dumps(self.to_json(), indent=2))
+
+
+class MetricsExporter:
+    """
+    Background thread writing the registry to a Prometheus text file and/or a JSON snapshot
+    every interval seconds, and once more when stopped.
+    """
+    def __init__(self, registry, prometheus_path=None, json_path=None, interval=15.0):
+        self.registry = registry
+        self.prometheus_path = prometheus_path
+        self.json_path = json_path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.prometheus_path or self.json_path:
+            self.thread = threading.Thread(target=self.run, name="metrics-exporter", daemon=True)
+            self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.export()
+
+    def export(self):
+        try:
+            if self.prometheus_path:
+                self.registry.write_prometheus(self.prometheus_path)
+            if self.json_path:
+                self.registry.write_json(self.json_path)
+        except OSError:
+            # Metrics must never take the pipeline down
+            pass
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+            self.export()
+
+
+def format_labels(labels):
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def write_atomically(path, content):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        f.write(content)
+    os.replace(temporary, path)
+
+
+# Registry shared by the pipeline modules
+REGISTRY = MetricsRegistry(enabled=os.getenv("ALPR_METRICS", "1") != "0")
+STAGE_SECONDS = "alpr_stage_seconds"
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+def stage_timer(stage):
+    """
+    Time a pipeline stage into the alpr_stage_seconds histogram.
+
+    Args:
+        stage (str): Name of the stage, e.g. "localisation".
+    """
+    if not REGISTRY.enabled:
+        return NULL_TIMER
+    return REGISTRY.timer(STAGE_SECONDS, "Latency of each pipeline stage in seconds.", stage=stage)
+
+
+def record_stage(stage, seconds):
+    """
+    Record a stage latency that was measured by the caller.
+    """
+    if REGISTRY.enabled:
+        REGISTRY.histogram(STAGE_SECONDS, "Latency of each pipeline stage in seconds.", stage=stage).observe(seconds)
+
+
+def count(name, help_text="", amount=1, **labels):
+    """
+    Increment a counter of the shared registry.
+    """
+    if REGISTRY.enabled:
+        REGISTRY.counter(name, help_text, **labels).inc(amount)
+
+
+def observe(name, value, help_text="", buckets=COUNT_BUCKETS, **labels):
+    """
+    Record a value, count-like by default, in a histogram of the shared registry.
+    """
+    if REGISTRY.enabled:
+        REGISTRY.histogram(name, help_text, buckets=buckets, **labels).observe(value)
+
+
+def set_gauge(name, value, help_text="", **labels):
+    """
+    Set a gauge of the shared registry.
+    """
+    if REGISTRY.enabled:
+        REGISTRY.gauge(name, help_text, **labels).set(value)
@@ -1,39 +1,93 @@
+import cv2
 import numpy as np
-from tensorflow.keras.preprocessing.image import load_img, img_to_array
-import tensorflow as tf
+from alpr import metrics
+from alpr.utils import get_logger
+
+logger = get_logger("OCR")
 
 class OCR:
     def __init__(self, model_path):
+        # TensorFlow takes seconds and hundreds of MB to import, so only pay for it when an
+        # OCR model is actually loaded
+        import tensorflow as tf
+
         self.model = tf.keras.models.load_model(model_path)
         self.class_labels = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9',
                              'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J',
                              'K', 'L', 'M', 'N', 'P', 'Q', 'R', 'S', 'T', 'U',
                              'V', 'W', 'X', 'Y', 'Z']
+        _, self.expected_height, self.expected_width, _ = self.model.input_shape
 
-    def predict_letter(self, image_path):
+    def prepare_batch(self, segments):
+        """
+        Resize every character segment to the model input size and normalise the whole
+        batch in one step.
 
-        _, expected_height, expected_width, _ = self.model.input_shape
-        print(f"{expected_height} and {expected_width}")
+        Args:
+            segments (list[np.array]): Character crops in BGR (or grayscale) format.
 
-        image = load_img(image_path, target_size=(expected_height, expected_width), color_mode='rgb')
-        image_array = img_to_array(image)
-        image_array = np.expand_dims(image_array, axis=0)  # batch dimension
-        image_array = image_array / 255.0                  # normalize to 0-1
+        Returns:
+            np.array: Float32 batch of shape (N, height, width, 3) with values in [0, 1].
+        """
+        batch = np.empty((len(segments), self.expected_height, self.expected_width, 3), dtype=np.float32)
+        for i, segment in enumerate(segments):
+            # Nearest neighbour matches the keras load_img default the model was trained with.
+            resized = cv2.resize(segment, (self.expected_width, self.expected_height),
+                                 interpolation=cv2.INTER_NEAREST)
+            if resized.ndim == 2:
+                batch[i] = cv2.cvtColor(resized, cv2.COLOR_GRAY2RGB)
+            else:
+                batch[i] = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+        batch *= 1.0 / 255.0
+        return batch
 
-        # 3. Predict using the model
-        predictions = self.model.predict(image_array)  # shape: (1, number_of_classes)
-        predicted_class_index = np.argmax(predictions[0])
+    def classify(self, segments):
+        """
+        Classify character segments in a single forward pass.
 
-        # 4. Map the predicted class index to the corresponding label
-        predicted_letter = class_labels[predicted_class_index]
-        
-        return predicted_letter
+        Args:
+            segments (list[np.array]): Character crops in BGR format.
 
+        Returns:
+            tuple: (list of predicted characters, np.array of their probabilities)
+        """
+        if len(segments) == 0:
+            return [], np.empty(0, dtype=np.float32)
 
-    def ocr_from_segments(self, segment_files):
-        recognized_text = ""
-        for file_path in segment_files:
-            letter = self.predict_letter(file_path)
-            recognized_text += letter.strip()
-        return recognized_text
+        with metrics.stage_timer("ocr"):
+            predictions = np.asarray(self.model.predict_on_batch(self.prepare_batch(segments)))
+        indices = np.argmax(predictions, axis=1)
+        probabilities = predictions[np.arange(len(indices)), indices]
+        logger.debug("Classified %d characters.", len(indices))
+        return [self.class_labels[i] for i in indices], probabilities
+
+    def ocr_plates(self, plates):
+        """
+        Read several license plates with one forward pass over all of their characters.
+
+        Args:
+            plates (list[list[np.array]]): Character crops for each plate, ordered left to right.
 
+        Returns:
+            list[tuple]: (recognized text, per-character probabilities) for each plate.
+        """
+        segments = [segment for plate in plates for segment in plate]
+        letters, probabilities = self.classify(segments)
+
+        readings = []
+        start = 0
+        for plate in plates:
+            end = start + len(plate)
+            readings.append(("".join(letters[start:end]), probabilities[start:end]))
+            start = end
+        return readings
+
+    def predict_letter(self, image_path):
+        image = cv2.imread(image_path)
+        letters, _ = self.classify([image])
+        return letters[0]
+
+    def ocr_from_segments(self, segment_files):
+        segments = [cv2.imread(file_path) for file_path in segment_files]
+        letters, _ = self.classify(segments)
+        return "".join(letters)
@@ -1,8 +1,12 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
-from alpr.utils import log, add_bp, test_manager
-from alpr.upscaler import Upscaler
+from alpr import metrics
+from alpr.utils import get_logger
+
+logger = get_logger("RECTIFICATION")
 
 class Rectification:
     """
@@ -14,7 +18,10 @@ class Rectification:
                  upscaler, 
                  test_manager, 
                  output_size=(794, 400), 
-                 power_level=3):
+                 power_level=3,
+                 workers=1,
+                 first_match=False,
+                 top_k=1):
         """
         Initialize the Rectification object with model configuration and processing parameters.
         
@@ -25,8 +32,14 @@ class Rectification:
             cropped_dir (list[str], optional): List of directories containing cropped images.
             output_dir (str, optional): Directory to store the rectified images.
             power_level (int, optional): Determines the threshold level for generating grayscale images.
+            workers (int, optional): Number of threads searching the contour elements in parallel.
+                                     OpenCV releases the GIL, so this scales with the cores.
+            first_match (bool, optional): Stop at the first element, in priority order, that yields
+                                          a 4-corner contour instead of collecting all of them.
+            top_k (int, optional): Number of best scoring contours warped per image.
         """
         self.output_size = output_size
+        self.upscaler = upscaler
         self.sr = upscaler.get_sr() 
         self.input_height = 640
         self.input_weight = 640
@@ -40,27 +53,59 @@ class Rectification:
         ]
         self.test_manager = test_manager
         self.power_level = power_level
+        self.cropped_dir = None
+        self.output_dir = None
+
+        # Constant preprocessing objects, built once and reused for every image.
+        self.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        self.vignette_masks = {}
+
+        self.workers = workers
+        self.first_match = first_match
+        self.top_k = top_k
+        self.executor = None
+
+    def get_executor(self):
+        """
+        Return the thread pool used for the contour search, starting it on first use.
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers,
+                                               thread_name_prefix="rectification")
+        return self.executor
+
+    def close(self):
+        """
+        Shut down the contour search thread pool, if one was started.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
 
     def set_directories(self, cropped_dir, output_dir):
         self.cropped_dir = cropped_dir
         self.output_dir = output_dir
         if self.cropped_dir and self.output_dir:
-            log("RECTIFICATION", f"Input directories: {self.cropped_dir} | Output directory: {self.output_dir}")
+            logger.info("Input directories: %s | Output directory: %s", self.cropped_dir, self.output_dir)
 
-    def preprocess_image(self, image):
+    def preprocess_image(self, image, cache_key=None):
         """
         Upsample and resize the input image to standard dimensions for further processing.
         
         Args:
             image (np.array): Input image in BGR format.
+            cache_key (optional): Key of the crop in the upscaler's frame cache, so the
+                                  super-resolution output is shared with Segmentation.
         
         Returns:
             np.array: Preprocessed image.
         """
-        # Upsample the image using the super-resolution model.
-        upsampled_image = self.sr.upsample(image)
-        log("RECTIFICATION", "Preprocessing completed.")
-        return cv2.resize(upsampled_image, (self.input_height, self.input_weight))
+        # Upsample the image, the upscaler only runs the super-resolution model when needed.
+        preprocessed = self.upscaler.upscale_image(
+            image, (self.input_height, self.input_weight), cache_key
+        )
+        logger.debug("Preprocessing completed.")
+        return preprocessed
 
     def process_gray_images(self, filtered_image, power_level=None):
         """
@@ -77,15 +122,17 @@ class Rectification:
         if power_level is None:
             power_level = self.power_level
         
-        processed_images = []
-        log("RECTIFICATION", "Thresholding grayscale images for contour detection.")
+        logger.debug("Thresholding grayscale images for contour detection.")
 
-        # Apply a series of thresholds based on the power level configuration.
-        for thresh in self.thresholds_levels[power_level]:
-            _, thresh_img = cv2.threshold(filtered_image, thresh, 255, cv2.THRESH_BINARY)
-            processed_images.append(thresh_img)
+        # Apply a series of thresholds based on the power level configuration, writing the
+        # binary images into one buffer allocated up front.
+        levels = self.thresholds_levels[power_level]
+        stack = np.empty((len(levels),) + filtered_image.shape, dtype=np.uint8)
+        for thresh, thresh_img in zip(levels, stack):
+            cv2.threshold(filtered_image, thresh, 255, cv2.THRESH_BINARY, dst=thresh_img)
+        processed_images = list(stack)
 
-        log("RECTIFICATION", f"Generated {len(self.thresholds_levels[power_level])} binary images.")
+        logger.debug("Generated %d binary images.", len(processed_images))
         return processed_images
 
     def apply_vignette(self, image, kernel_scale=200):
@@ -100,20 +147,35 @@ class Rectification:
             np.array: Image with the vignette effect applied.
         """
         rows, cols = image.shape[:2]
-        kernel_x = cv2.getGaussianKernel(cols, kernel_scale)
-        kernel_y = cv2.getGaussianKernel(rows, kernel_scale)
-        kernel = kernel_y * kernel_x.T
-        mask = kernel / kernel.max()  # Normalize mask to range [0, 1]
-
-        # Apply the mask to each channel.
-        vignette = np.empty_like(image, dtype=np.float32)
-        for i in range(3):  # For B, G, R channels.
-            vignette[:, :, i] = image[:, :, i] * mask
-
-        # Clip values and convert to uint8.
-        vignette = np.clip(vignette, 0, 255).astype(np.uint8)
+        mask = self.get_vignette_mask(rows, cols, kernel_scale)
+
+        # Apply the mask to all channels at once. The mask is in [0, 1] so no clipping is
+        # needed; the float32 step keeps the rounding of the original per-channel loop.
+        vignette = (image * mask).astype(np.float32).astype(np.uint8)
         return vignette
 
+    def get_vignette_mask(self, rows, cols, kernel_scale=200):
+        """
+        Return the normalised Gaussian vignette mask for an image size, building it once.
+
+        Args:
+            rows (int): Image height.
+            cols (int): Image width.
+            kernel_scale (float): Standard deviation for the Gaussian kernel.
+
+        Returns:
+            np.array: Mask of shape (rows, cols, 1) with values in [0, 1].
+        """
+        key = (rows, cols, kernel_scale)
+        mask = self.vignette_masks.get(key)
+        if mask is None:
+            kernel_x = cv2.getGaussianKernel(cols, kernel_scale)
+            kernel_y = cv2.getGaussianKernel(rows, kernel_scale)
+            kernel = kernel_y * kernel_x.T
+            mask = (kernel / kernel.max())[:, :, None]  # Normalize mask to range [0, 1]
+            self.vignette_masks[key] = mask
+        return mask
+
     def darken_gray_pixels(self, bgr_image, threshold=15):
         """
         Darken pixels that are nearly gray by setting them to black.
@@ -142,8 +204,7 @@ class Rectification:
         Generate a collection of processed image elements to aid in contour detection.
         
         This method applies several preprocessing techniques such as gray conversion, 
-        bilateral filtering, vignette effect, gamma correction, CLAHE, Gaussian blur, 
-        and Laplacian filtering.
+        bilateral filtering, vignette effect, CLAHE, Gaussian blur, and Laplacian filtering.
         
         Args:
             img (np.array): Input image in BGR format.
@@ -151,46 +212,40 @@ class Rectification:
         Returns:
             tuple: (RGB image, list of processed images for contour detection)
         """
-        log("RECTIFICATION", "Generating contour elements.")
+        logger.debug("Generating contour elements.")
         rgb_image = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
         # Remove nearly gray pixels.
         processed_image = self.darken_gray_pixels(img, threshold=15)
         gray_removed = cv2.cvtColor(processed_image, cv2.COLOR_BGR2GRAY)
-        log("RECTIFICATION", "Nearly gray areas darkened and removed.")
+        logger.debug("Nearly gray areas darkened and removed.")
 
         # Apply vignette effect.
         vignette = self.apply_vignette(img)
         gray_vignette = cv2.cvtColor(vignette, cv2.COLOR_BGR2GRAY)
-        log("RECTIFICATION", "Vignette effect generated.")
+        logger.debug("Vignette effect generated.")
 
         # Standard grayscale and filtering.
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         filtered = cv2.bilateralFilter(gray, 9, 78, 40)
-        filtered_vignette = cv2.bilateralFilter(gray, 9, 78, 40)
+        # Both filtered images come from the same gray input, so the filter is computed once.
+        filtered_vignette = filtered
         edged = cv2.Canny(gray, 100, 180)
-        log("RECTIFICATION", "Generated blurred, edge, and vignette images.")
+        logger.debug("Generated blurred, edge, and vignette images.")
 
         # Additional thresholding for contour detection.
         processed_grays = self.process_gray_images(filtered)
-        processed_grays_v = self.process_gray_images(filtered_vignette)
-
-        # Gamma correction.
-        invGamma = 0.5
-        table = np.array([((i / 255.0) ** invGamma) * 255 for i in range(256)]).astype("uint8")
-        gamma_corrected = cv2.LUT(rgb_image, table)
-        log("RECTIFICATION", "Gamma correction applied.")
+        processed_grays_v = processed_grays
 
         # Enhance contrast using CLAHE.
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        gray_enhanced = clahe.apply(gray)
-        log("RECTIFICATION", "CLAHE contrast enhancement applied.")
+        gray_enhanced = self.clahe.apply(gray)
+        logger.debug("CLAHE contrast enhancement applied.")
 
         # Gaussian blur and Laplacian edge detection.
         blurred = cv2.GaussianBlur(gray, (3, 3), 0)
         laplacian = cv2.Laplacian(blurred, cv2.CV_64F)
         abs_laplacian = cv2.convertScaleAbs(laplacian)
-        log("RECTIFICATION", "Laplacian computed.")
+        logger.debug("Laplacian computed.")
 
         # Compile all elements.
         contour_elements = [
@@ -216,14 +271,15 @@ class Rectification:
             image_input (np.array): Input image for contour detection.
             contours_output (list): List to append the detected contour.
         """
-        log("RECTIFICATION", "Plotting detected contour.")
+        logger.debug("Plotting detected contour.")
         number_plate_contour = self.detect_contours(image_input)
         if number_plate_contour is not None:
-            cv2.drawContours(image_input, [number_plate_contour], -1, (0, 255, 0), 3)
+            # The element is not drawn on: elements can be shared between several entries of
+            # the contour element list and must stay untouched for the next detection.
             contours_output.append(number_plate_contour)
-            log("RECTIFICATION", "Contour with 4 corners plotted.")
+            logger.debug("Contour with 4 corners plotted.")
         else:
-            log("RECTIFICATION", "Did not detect contour.")
+            logger.debug("Did not detect contour.")
 
     def order_points(self, pts):
         """
@@ -242,7 +298,7 @@ class Rectification:
         diff = np.diff(pts, axis=1)
         rect[1] = pts[np.argmin(diff)]
         rect[3] = pts[np.argmax(diff)]
-        log("RECTIFICATION", "Contour points ordered.")
+        logger.debug("Contour points ordered.")
         return rect
 
     def restructure_array(self, arr):
@@ -268,10 +324,10 @@ class Rectification:
         Returns:
             np.array: Rectified image.
         """
-        log("RECTIFICATION", "Straightening image using homography transform.")
+        logger.debug("Straightening image using homography transform.")
         src_pts = np.float32(self.restructure_array(src_pts))
         ordered_src_pts = self.order_points(src_pts)
-        log("RECTIFICATION", f"Source points for homography: {ordered_src_pts}")
+        logger.debug("Source points for homography: %s", ordered_src_pts)
 
         # Define destination points for the rectified image.
         dst_pts = np.float32([
@@ -283,9 +339,124 @@ class Rectification:
         
         H, _ = cv2.findHomography(ordered_src_pts, dst_pts)
         warped_image = cv2.warpPerspective(image, H, (self.segmentation_width, self.segmentation_height))
-        log("RECTIFICATION", "Homography transform applied.")
+        logger.debug("Homography transform applied.")
         return warped_image
 
+    def order_contour(self, contour):
+        """
+        Return the corners of a 4-point contour ordered top-left, top-right, bottom-right,
+        bottom-left.
+        """
+        return self.order_points(np.float32(self.restructure_array(contour)))
+
+    def score_contour(self, contour, source_shape=None):
+        """
+        Score how much a 4-corner contour looks like a license plate.
+
+        The score is the product of three terms in [0, 1]:
+            - aspect: closeness of the quad's aspect ratio, at the crop's original scale, to
+              the rectified output size,
+            - area: fraction of the largest accepted contour area that the quad covers,
+            - rectangularity: quad area over the area of its minimum bounding rectangle.
+
+        Args:
+            contour (np.array): Contour with four corners, in the working image.
+            source_shape (tuple, optional): Shape of the crop before it was stretched to the
+                                            working size. Without it the aspect is measured
+                                            in the working image.
+
+        Returns:
+            float: Score in [0, 1], higher is better.
+        """
+        corners = self.order_contour(contour)
+        if source_shape is not None:
+            # The working image stretches the crop to a square, undo it for the aspect
+            crop_h, crop_w = source_shape[:2]
+            corners = corners * (crop_w / self.input_weight, crop_h / self.input_height)
+        tl, tr, br, bl = corners
+        width = (np.linalg.norm(tr - tl) + np.linalg.norm(br - bl)) / 2
+        height = (np.linalg.norm(bl - tl) + np.linalg.norm(br - tr)) / 2
+        if width <= 0 or height <= 0:
+            return 0.0
+
+        target_aspect = self.segmentation_width / self.segmentation_height
+        aspect_score = np.exp(-abs(np.log((width / height) / target_aspect)))
+
+        area = cv2.contourArea(contour)
+        upper_bound = self.input_height * self.input_weight * self.contour_detection_area
+        area_score = min(area / upper_bound, 1.0)
+
+        (_, _), (rect_w, rect_h), _ = cv2.minAreaRect(contour)
+        rectangularity = area / (rect_w * rect_h) if rect_w * rect_h > 0 else 0.0
+
+        return float(aspect_score * area_score * rectangularity)
+
+    def rank_contours(self, contours, corner_tolerance=10, source_shape=None):
+        """
+        Deduplicate contours by corner similarity and rank them by score.
+
+        Two contours are duplicates when every ordered corner is within corner_tolerance
+        pixels; the first one found (highest priority element) is kept.
+
+        Args:
+            contours (list[np.array]): Contours with four corners, in priority order.
+            corner_tolerance (float): Maximum corner distance, in pixels, for duplicates.
+            source_shape (tuple, optional): Shape of the original crop, see score_contour().
+
+        Returns:
+            list[tuple]: (score, contour) sorted from best to worst.
+        """
+        unique = []
+        for contour in contours:
+            corners = self.order_contour(contour)
+            if any(np.abs(corners - kept).max() <= corner_tolerance for kept, _ in unique):
+                continue
+            unique.append((corners, contour))
+
+        ranked = [(self.score_contour(contour, source_shape), contour) for _, contour in unique]
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        logger.debug("Ranked %d unique contours out of %d.", len(ranked), len(contours))
+        return ranked
+
+    def rectify_candidates(self, image, top_k=None, cache_key=None):
+        """
+        Process a single image to detect contours and rectify the best scoring ones.
+
+        Only the top_k contours are warped; the others never pay for a homography.
+
+        Args:
+            image (np.array): Input image in BGR format.
+            top_k (int, optional): Number of rectifications to return. Defaults to self.top_k.
+            cache_key (optional): Key of the crop in the upscaler's frame cache.
+
+        Returns:
+            list[tuple]: (score, rectified image) sorted from best to worst.
+        """
+        if top_k is None:
+            top_k = self.top_k
+
+        candidates = []
+        try:
+            with metrics.stage_timer("rectification"):
+                preprocessed = self.preprocess_image(image, cache_key)
+                processed_rgb, contour_elements = self.generate_contour_elements(preprocessed)
+
+                with metrics.stage_timer("contour_search"):
+                    detected_contours = self.find_contours(contour_elements)
+                metrics.observe("alpr_contours_per_crop", len(detected_contours),
+                                "Plate-like contours found per cropped plate.")
+                if not detected_contours:
+                    logger.info("No valid contours detected for rectification.")
+
+                for score, cnt in self.rank_contours(detected_contours, source_shape=image.shape)[:top_k]:
+                    candidates.append((score, self.straighten_image(cnt, processed_rgb)))
+                    logger.debug("Rectified candidate with score %.3f.", score)
+
+        except Exception as e:
+            metrics.count("alpr_errors_total", "Errors caught in the pipeline.", stage="rectification")
+            logger.error("Error during rectification: %s", e)
+        return candidates
+
     def rectify_image(self, image):
         """
         Process a single image to detect contours and rectify it.
@@ -294,33 +465,30 @@ class Rectification:
             image (np.array): Input image in BGR format.
         
         Returns:
-            np.array: Rectified image if successful; otherwise, None.
+            np.array: Best scoring rectified image if successful; otherwise, None.
         """
-        rectified_image = None
-        try:
-            # Dummy filename used for saving output.
-            dummy_filename = "image"
-            preprocessed = self.preprocess_image(image)
-            processed_rgb, contour_elements = self.generate_contour_elements(preprocessed)
-
-
-            detected_contours = []
-            # Loop through each processed element to plot contours.
-            for element in contour_elements:
-                self.plot_contour(element, detected_contours)
-
-            if detected_contours:
-                for cnt in detected_contours:
-                    rectified_image = self.straighten_image(cnt, processed_rgb)
-                    output_path = os.path.join(self.output_dir, f'{os.path.splitext(dummy_filename)[0]}_rectified.jpg')
-                    cv2.imwrite(output_path, rectified_image)
-                    log("RECTIFICATION", f"Rectified image saved at {output_path}.")
-            else:
-                log("RECTIFICATION", "No valid contours detected for rectification.")
+        candidates = self.rectify_candidates(image, top_k=1)
+        return candidates[0][1] if candidates else None
 
-        except Exception as e:
-            log("RECTIFICATION", f"Error during rectification: {e}")
-        return rectified_image
+    def rectify_arrays(self, images, cache_keys=None):
+        """
+        Rectify in-memory images without reading or writing any files.
+
+        Args:
+            images (list[np.array]): Cropped license plates in BGR format.
+            cache_keys (list, optional): Frame cache key of each crop.
+
+        Returns:
+            list[np.array]: The top_k rectifications of each image, best first.
+        """
+        if cache_keys is None:
+            cache_keys = [None] * len(images)
+        rectified_images = []
+        for image, cache_key in zip(images, cache_keys):
+            candidates = self.rectify_candidates(image, cache_key=cache_key)
+            rectified_images.extend(rectified for _, rectified in candidates)
+        logger.info("Total rectified images: %d", len(rectified_images))
+        return rectified_images
 
     def rectify(self):
         """
@@ -331,30 +499,90 @@ class Rectification:
         """
         successful_rectifications = 0
         if not self.cropped_dir or not self.output_dir:
-            log("RECTIFICATION", "Cropped or output directory not set.")
+            logger.warning("Cropped or output directory not set.")
             return successful_rectifications
 
         for directory in self.cropped_dir:
             idx = 0
             for image_file in os.listdir(directory):
-                log("RECTIFICATION", f"Attempting to rectify {image_file}.")
+                logger.debug("Attempting to rectify %s.", image_file)
                 crop_filename = os.path.join(directory, image_file)
                 image = cv2.imread(crop_filename)
-                log("RECTIFICATION", "Image loaded successfully.")
-                rectified = self.rectify_image(image)
-                if rectified is not None:
+                logger.debug("Image loaded successfully.")
+                candidates = self.rectify_candidates(image)
+                for rank, (_, rectified) in enumerate(candidates):
+                    # Crops of every padding share a file name, so the directory name is kept
                     rectified_filename = os.path.join(
-                        self.output_dir, f"{os.path.splitext(image_file)[0]}_rectified_{idx+1}.jpg"
+                        self.output_dir,
+                        f"{os.path.basename(os.path.normpath(directory))}_{os.path.splitext(image_file)[0]}"
+                        f"_rectified_{idx+1}_{rank+1}.jpg"
                     )
                     cv2.imwrite(rectified_filename, rectified)
                     successful_rectifications += 1
-                    log("RECTIFICATION", f"{image_file} rectified successfully.")
+                if candidates:
+                    logger.info("%s rectified successfully.", image_file)
                 else:
-                    log("RECTIFICATION", f"{image_file} rectification unsuccessful.")
+                    logger.info("%s rectification unsuccessful.", image_file)
                 idx += 1
-        log("RECTIFICATION", f"Total rectified images: {successful_rectifications}")
+        logger.info("Total rectified images: %d", successful_rectifications)
         return successful_rectifications
 
+    def find_contours(self, contour_elements):
+        """
+        Search every contour element for a plate-like 4-corner contour.
+
+        Elements shared between entries (same filter output) are only searched once. With
+        workers > 1 the search runs on a thread pool; with first_match the search stops at
+        the first element, in list order, that yields a contour and the pending searches
+        are cancelled.
+
+        Args:
+            contour_elements (list[np.array]): Processed images, in priority order.
+
+        Returns:
+            list[np.array]: Detected contours in element order.
+        """
+        unique_elements = list({id(element): element for element in contour_elements}.values())
+
+        if self.workers > 1:
+            cancelled = threading.Event()
+            futures = [
+                self.get_executor().submit(self.detect_contours_unless_cancelled, element, cancelled)
+                for element in unique_elements
+            ]
+            searched = {}
+            for element, future in zip(unique_elements, futures):
+                searched[id(element)] = future.result()
+                if self.first_match and searched[id(element)] is not None:
+                    cancelled.set()
+                    for pending in futures:
+                        pending.cancel()
+                    break
+        else:
+            searched = {}
+            for element in unique_elements:
+                searched[id(element)] = self.detect_contours(element)
+                if self.first_match and searched[id(element)] is not None:
+                    break
+
+        detected_contours = []
+        for element in contour_elements:
+            number_plate_contour = searched.get(id(element))
+            if number_plate_contour is not None:
+                detected_contours.append(number_plate_contour)
+                if self.first_match:
+                    break
+        logger.debug("Detected %d contours with 4 corners.", len(detected_contours))
+        return detected_contours
+
+    def detect_contours_unless_cancelled(self, processed_img, cancelled):
+        """
+        Run detect_contours unless another element already produced the first match.
+        """
+        if cancelled.is_set():
+            return None
+        return self.detect_contours(processed_img)
+
     def detect_contours(self, processed_img):
         """
         Find and return the best contour that likely represents a number plate.
@@ -365,7 +593,7 @@ class Rectification:
         Returns:
             np.array or None: Contour with four corners if detected; otherwise, None.
         """
-        log("RECTIFICATION", "Finding contour points.")
+        logger.debug("Finding contour points.")
         cnts = cv2.findContours(processed_img.copy(), cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)[0]
         # Sort contours by area (largest first) and consider the top 30.
         cnts = sorted(cnts, key=cv2.contourArea, reverse=True)[:30]
@@ -374,7 +602,7 @@ class Rectification:
         lower_bound = total_area * (1 - self.contour_detection_area)
         upper_bound = total_area * self.contour_detection_area
 
-        log("RECTIFICATION", "Contour detection parameters configured.")
+        logger.debug("Contour detection parameters configured.")
 
         number_plate_contour = None
         for c in cnts:
@@ -383,6 +611,6 @@ class Rectification:
             # Check for a 4-corner contour within the desired area bounds.
             if len(approx) == 4 and lower_bound < cv2.contourArea(c) < upper_bound:
                 number_plate_contour = approx
-                log("RECTIFICATION", "Detected contour with 4 corners.")
+                logger.debug("Detected contour with 4 corners.")
                 break
         return number_plate_contour
@@ -1,7 +1,58 @@
 import os
 import cv2
-from ultralytics import YOLO
-from alpr.utils import log
+import numpy as np
+from alpr.consensus import PlateConsensus
+from alpr import metrics
+from alpr.backends import create_backend
+from alpr.utils import get_logger
+
+logger = get_logger("SEGMENTATION")
+
+
+class CharacterDetections:
+    """
+    Character boxes detected by the segmentation model on one license plate candidate.
+    """
+    def __init__(self, boxes, classes, confidences, names):
+        """
+        Args:
+            boxes (np.array): (N, 4) boxes as (x1, y1, x2, y2) in upscaled image coordinates.
+            classes (np.array): (N,) class indices.
+            confidences (np.array): (N,) detection confidences.
+            names (dict): Mapping from class index to character.
+        """
+        self.boxes = boxes
+        self.classes = classes
+        self.confidences = confidences
+        self.names = names
+
+    @classmethod
+    def from_result(cls, result, names):
+        """
+        Build from a DetectionResult of the detector backend.
+        """
+        return cls(result.boxes, result.classes, result.confidences, names)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def order(self):
+        """
+        Indices of the boxes sorted left to right.
+        """
+        return np.argsort(self.boxes[:, 0].astype(int), kind="stable")
+
+    def license_plate(self):
+        """
+        Concatenate the character classes from left to right.
+        """
+        return "".join(self.names[int(c)] for c in self.classes[self.order()])
+
+    def confidence(self):
+        """
+        Mean confidence of the detected characters, 0 when nothing was detected.
+        """
+        return float(self.confidences.mean()) if len(self) else 0.0
 
 
 class Segmentation:
@@ -12,124 +63,258 @@ class Segmentation:
         padding_levels=[-5, -2, 0, 5, 10, 20],
         input_height=400,
         input_width=794,
+        max_batch_size=16,
+        agreement_threshold=0.6,
+        min_agreeing_candidates=3,
+        backend="auto",
+        confidence=0.25,
+        iou=0.7,
     ):
-        self.model = YOLO(model_path)
+        self.detector = create_backend(model_path, backend)
+        self.confidence = confidence
+        self.iou = iou
         self.padding_levels = padding_levels
         self.upscaler = upscaler
         self.input_height = input_height
         self.input_width = input_width
+        self.max_batch_size = max_batch_size
+        self.agreement_threshold = agreement_threshold
+        self.min_agreeing_candidates = min_agreeing_candidates
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the per-image state so the same instance can segment the next image.
+        """
         self.idx = 0
+        self.license_plate_result = None
+        self.segments = []
+        self.consensus = PlateConsensus(self.agreement_threshold, self.min_agreeing_candidates)
 
     def set_directories(self, cropped_dir, rectified_dir, output_dir):
         self.cropped_directories = cropped_dir
         self.rectified_dir = rectified_dir
         self.output_dir = output_dir
         if self.cropped_directories and self.output_dir and self.rectified_dir:
-            log(
-                "SEGMENTATION",
-                f"Input directories: {self.cropped_directories} & {self.rectified_dir} | Output directory: {self.output_dir} ",
+            logger.info(
+                "Input directories: %s & %s | Output directory: %s",
+                self.cropped_directories, self.rectified_dir, self.output_dir,
             )
 
     def upscale_input(self, image_path):
         image = cv2.imread(image_path)
         if image is None:
-            log("SEGMENTATION", f"Failed to read image from {image_path}.")
+            logger.warning("Failed to read image from %s.", image_path)
             return None
+        return self.upscale_array(image)
+
+    def upscale_array(self, image):
         upscaled_image = self.upscaler.upscale_image(
             image, (self.input_width, self.input_height)
         )
-        cv2.imwrite(image_path, upscaled_image)
-        log("SEGMENTATION", "Upscaled input.")
+        logger.debug("Upscaled input.")
         return upscaled_image
 
-    def segment_characters(self, image_path, output_dir, zoom):
-        os.makedirs(output_dir, exist_ok=True)
-        # Upscale and retrieve the image
-        image = self.upscale_input(image_path)
-        if image is None:
-            return 0
+    def detect_batch(self, images, cache_keys=None):
+        """
+        Upscale every license plate candidate and run the segmentation model on all of them
+        in a single predict call (split into chunks of max_batch_size).
 
-        results = self.model.predict(source=image_path)
-        for result in results:
-            boxes = result.boxes.xyxy.cpu().numpy()
-            # labels = result.boxes.cls.cpu().numpy()  # if needed
-            for idx, box in enumerate(boxes):
-                x1, y1, x2, y2 = map(int, box)
-                crop = image[
+        Args:
+            images (list[np.array]): License plate candidates in BGR format.
+            cache_keys (list, optional): Upscaler frame cache key per candidate, so crops
+                                         already super-resolved by Rectification are reused.
+
+        Returns:
+            list[tuple]: (upscaled image, CharacterDetections) per candidate, in input order.
+        """
+        # Crops already super-resolved by Rectification come from the upscaler's frame cache
+        upscaled = self.upscaler.upscale_batch(
+            images, (self.input_width, self.input_height), cache_keys
+        )
+        detections = []
+        with metrics.stage_timer("segmentation"):
+            for start in range(0, len(upscaled), self.max_batch_size):
+                batch = upscaled[start : start + self.max_batch_size]
+                results = self.detector.predict(batch, self.confidence, self.iou)
+                detections.extend(
+                    CharacterDetections.from_result(result, self.detector.names) for result in results
+                )
+        logger.debug("Detected characters on %d candidates.", len(upscaled))
+        return list(zip(upscaled, detections))
+
+    def detect_characters(self, image):
+        """
+        Upscale a license plate once and run the segmentation model on it once.
+
+        Args:
+            image (np.array): License plate image in BGR format.
+
+        Returns:
+            tuple: (upscaled image, CharacterDetections)
+        """
+        return self.detect_batch([image])[0]
+
+    def crop_characters(self, image, boxes, zoom):
+        """
+        Crop the characters from cached boxes with the given margin.
+
+        Args:
+            image (np.array): The upscaled image the boxes were detected on.
+            boxes (np.array): Character boxes as (x1, y1, x2, y2).
+            zoom (int): Margin, in pixels, added around each character box.
+
+        Returns:
+            list[np.array]: Character crops, as views into the image, ordered as detected.
+        """
+        segments = []
+        for box in boxes:
+            x1, y1, x2, y2 = map(int, box)
+            segments.append(
+                image[
                     max(y1 - zoom, 0) : min(y2 + zoom, image.shape[0]),
                     max(x1 - zoom, 0) : min(x2 + zoom, image.shape[1]),
                 ]
-                seg_filename = os.path.join(output_dir, f"segment_{idx + 1}.jpg")
-                cv2.imwrite(seg_filename, crop)
-            log("SEGMENTATION", f"Saved characters to {output_dir}.")
+            )
+        return segments
+
+    def segment_batch(self, images, cache_keys=None):
+        """
+        Segment the characters of several in-memory license plates at every padding level.
+
+        The super-resolution pass and the model run once per candidate, with all candidates
+        batched together; each zoom level is then cut from the cached boxes.
+
+        Args:
+            images (list[np.array]): License plate images in BGR format.
+            cache_keys (list, optional): Upscaler frame cache key per candidate.
+
+        Returns:
+            list[tuple]: (list of (zoom, character crops), CharacterDetections) per candidate.
+        """
+        outputs = []
+        for image, detections in self.detect_batch(images, cache_keys):
+            zoomed_segments = [
+                (zoom, self.crop_characters(image, detections.boxes, zoom))
+                for zoom in self.padding_levels
+            ]
+            license_plate = detections.license_plate()
+            logger.debug("License Plate detected %s.", license_plate)
+            self.license_plate_result = license_plate
+            self.consensus.add(license_plate, detections.confidence())
+            outputs.append((zoomed_segments, detections))
+        return outputs
+
+    def segment_plate(self, image):
+        """
+        Segment the characters of a single in-memory license plate at every padding level.
+
+        Returns:
+            tuple: (list of (zoom, character crops), license plate string)
+        """
+        zoomed_segments, detections = self.segment_batch([image])[0]
+        return zoomed_segments, detections.license_plate()
+
+    def segment_arrays(self, images, cache_keys=None):
+        """
+        Segment in-memory license plate images at every padding level.
 
-        license_plate = self.get_license_plate(results)
+        The character crops are kept in self.segments as (index, zoom, crops) instead of
+        being written to the output directory.
 
-        return len(license_plate)
+        Args:
+            images (list[np.array]): Cropped and rectified license plates.
+            cache_keys (list, optional): Upscaler frame cache key per candidate.
+
+        Returns:
+            str: The license plate voted by the consensus of all candidates.
+        """
+        for zoomed_segments, _ in self.segment_batch(images, cache_keys):
+            for zoom, segments in zoomed_segments:
+                self.segments.append((self.idx, zoom, segments))
+                logger.debug(
+                    "Index: %d | Zoom Level: %s | Segmented %d characters from license plate.",
+                    self.idx, zoom, len(segments),
+                )
+            self.idx += 1
+        logger.info("Number of total images segmented: %d.", self.idx)
+
+        license_plate, _ = self.consensus.vote()
+        return license_plate
+
+    def segment_files(self, image_paths):
+        """
+        Segment license plate files in one batch and store the characters for every padding
+        level in output_dir/<index>/<zoom>/segment_<n>.jpg.
+
+        Args:
+            image_paths (list[str]): Paths to the cropped or rectified license plates.
+        """
+        images = []
+        for image_path in image_paths:
+            image = cv2.imread(image_path)
+            if image is None:
+                logger.warning("Failed to read image from %s.", image_path)
+                continue
+            logger.debug("Segmenting %s.", image_path)
+            images.append(image)
+
+        for zoomed_segments, _ in self.segment_batch(images):
+            dir_idx = os.path.join(self.output_dir, f"{self.idx}")
+            for zoom, segments in zoomed_segments:
+                output_seg_dir = os.path.join(dir_idx, f"{zoom}")
+                os.makedirs(output_seg_dir, exist_ok=True)
+                for idx, crop in enumerate(segments):
+                    seg_filename = os.path.join(output_seg_dir, f"segment_{idx + 1}.jpg")
+                    cv2.imwrite(seg_filename, crop)
+                logger.debug(
+                    "Index: %d | Zoom Level: %s | Segmented %d characters from license plate and stored in %s.",
+                    self.idx, zoom, len(segments), output_seg_dir,
+                )
+            self.idx += 1
 
     def get_license_plate(self, results):
         boxes = []
         for result in results:
-            for box in result.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                class_id = int(box.cls[0])
-                class_name = self.model.names[class_id]
-                boxes.append((x1, class_name))
+            for box, class_id in zip(result.boxes, result.classes):
+                boxes.append((int(box[0]), self.detector.names[int(class_id)]))
 
         # Sort boxes by x-coordinate and concatenate class names to form the license plate string
         boxes.sort(key=lambda b: b[0])
         license_plate = "".join([b[1] for b in boxes])
-        log("SEGMENTATION", f"License Plate detected {license_plate}.")
+        logger.debug("License Plate detected %s.", license_plate)
 
         self.license_plate_result = license_plate
 
         return license_plate
 
-    def process_cropped_images(self):
+    def cropped_image_paths(self):
+        image_paths = []
         for directory in self.cropped_directories:
             image_files = os.listdir(directory)
             if not image_files:
-                log("SEGMENTATION", f"No images found in {directory}.")
+                logger.info("No images found in %s.", directory)
                 continue
             # Assuming each directory contains one image
-            image_file = image_files[0]
-            crop_filename = os.path.join(directory, image_file)
-            log("SEGMENTATION", f"Segmenting {crop_filename} (Index: {self.idx}).")
+            image_paths.append(os.path.join(directory, image_files[0]))
+        return image_paths
 
-            for zoom in self.padding_levels:
-                dir_idx = os.path.join(self.output_dir, f"{self.idx}")
-                output_seg_dir = os.path.join(dir_idx, f"{zoom}")
-                os.makedirs(output_seg_dir, exist_ok=True)
-                n_char_segmented = self.segment_characters(
-                    crop_filename, output_seg_dir, zoom
-                )
-                log(
-                    "SEGMENTATION",
-                    f"Zoom Level: {zoom} | Segmented {n_char_segmented} characters from license plate and stored in {output_seg_dir}.",
-                )
-            self.idx += 1
+    def rectified_image_paths(self):
+        return [
+            os.path.join(self.rectified_dir, image_file)
+            for image_file in os.listdir(self.rectified_dir)
+        ]
 
-    def process_rectified_inputs(self):
-        for image_file in os.listdir(self.rectified_dir):
-            crop_filename = os.path.join(self.rectified_dir, image_file)
-            log("SEGMENTATION", f"Segmenting {crop_filename} (Index: {self.idx}).")
+    def process_cropped_images(self):
+        self.segment_files(self.cropped_image_paths())
 
-            for zoom in self.padding_levels:
-                dir_idx = os.path.join(self.output_dir, f"{self.idx}")
-                output_seg_dir = os.path.join(dir_idx, f"{zoom}")
-                os.makedirs(output_seg_dir, exist_ok=True)
-                n_char_segmented = self.segment_characters(
-                    crop_filename, output_seg_dir, zoom
-                )
-                log(
-                    "SEGMENTATION",
-                    f"Zoom Level: {zoom} | Segmented {n_char_segmented} characters from license plate and stored in {output_seg_dir}.",
-                )
-            self.idx += 1
+    def process_rectified_inputs(self):
+        self.segment_files(self.rectified_image_paths())
 
     def segment(self):
-        self.process_cropped_images()
-        self.process_rectified_inputs()
-        log("SEGMENTATION", f"Number of total images segmented: {self.idx}.")
+        # Cropped and rectified candidates go through the model in the same batch
+        self.segment_files(self.cropped_image_paths() + self.rectified_image_paths())
+        logger.info("Number of total images segmented: %d.", self.idx)
 
-        return self.license_plate_result
+        license_plate, _ = self.consensus.vote()
+        return license_plate
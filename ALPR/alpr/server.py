@@ -0,0 +1,442 @@
+import os
+import json
+import time
+import queue
+import socket
+import struct
+import threading
+from multiprocessing import shared_memory
+import numpy as np
+from alpr import metrics
+from alpr.utils import get_logger
+
+logger = get_logger("SERVER")
+
+HEADER = struct.Struct("!I")
+DEFAULT_SOCKET_PATH = "/tmp/alpr-model-server.sock"
+
+
+class ModelServerError(RuntimeError):
+    """
+    The model server failed a request, or the connection to it was lost.
+    """
+
+
+def send_message(sock, message):
+    """
+    Send a JSON message prefixed with its length.
+    """
+    data = json.dumps(message).encode()
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data.extend(chunk)
+    return bytes(data)
+
+
+def recv_message(sock):
+    """
+    Receive a message written by send_message(), or None once the peer closed the socket.
+    """
+    header = recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    data = recv_exactly(sock, HEADER.unpack(header)[0])
+    return None if data is None else json.loads(data)
+
+
+def attach_shared_memory(name):
+    """
+    Attach to a segment created by a client without taking ownership of it.
+
+    Before Python 3.13 every attaching process registers the segment with its resource
+    tracker, which would unlink it when the server exits while the client still uses it.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        from multiprocessing import resource_tracker
+
+        segment = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+class StubEngine:
+    """
+    Stands in for ALPREngine without loading any model, to exercise the server and its clients.
+
+    The "plate" read from a frame is a checksum of its pixels, so a client can tell that the
+    server saw exactly the frame it sent.
+    """
+    def __init__(self, delay=0.02):
+        """
+        Args:
+            delay (float): Seconds each batch takes, as if the models were running.
+        """
+        self.delay = delay
+
+    @staticmethod
+    def plate_for(image):
+        return f"STUB{int(image.sum(dtype=np.uint64)) % 100000:05d}"
+
+    def recognize_batch(self, images, camera_ids=None):
+        from alpr.engine import ALPRResult
+
+        time.sleep(self.delay)
+        return [ALPRResult(self.plate_for(image), None, 1.0, 1) for image in images]
+
+    def close(self):
+        pass
+
+
+class Connection:
+    """
+    A connected client and the shared-memory segments it sent frames in.
+    """
+    def __init__(self, sock, client_id):
+        self.sock = sock
+        self.client_id = client_id
+        self.segments = {}
+        self.write_lock = threading.Lock()
+
+    def send(self, message):
+        with self.write_lock:
+            try:
+                send_message(self.sock, message)
+            except OSError as e:
+                logger.warning("Client %d went away before its result was sent: %s", self.client_id, e)
+
+    def segment(self, name):
+        if name not in self.segments:
+            # A client only replaces its segment when a frame outgrows it
+            self.release_segments()
+            self.segments[name] = attach_shared_memory(name)
+        return self.segments[name]
+
+    def release_segments(self):
+        for segment in self.segments.values():
+            try:
+                segment.close()
+            except BufferError:
+                logger.warning("A frame of client %d is still referenced, leaving its segment mapped.",
+                               self.client_id)
+        self.segments = {}
+
+
+class ModelServer:
+    """
+    A local daemon hosting the ALPR models once for every camera process on the machine.
+
+    Clients connect over a Unix domain socket and send small JSON requests; the frames
+    themselves travel in shared memory segments owned by the clients, so no pixel goes
+    through the socket. Requests from all clients are gathered into batches of up to
+    max_batch frames, waiting at most max_wait seconds for a batch to fill, and run through
+    the engine's recognize_batch().
+
+    Only the batching thread touches the engine and the shared memory segments; the threads
+    reading from each client just queue the requests.
+    """
+    def __init__(self, engine, socket_path=DEFAULT_SOCKET_PATH, max_batch=8, max_wait=0.005):
+        """
+        Args:
+            engine (ALPREngine or StubEngine): Engine running the batches.
+            socket_path (str): Path of the Unix domain socket to listen on.
+            max_batch (int): Most frames run in one batch.
+            max_wait (float): Seconds to wait for more frames once a request arrived.
+        """
+        self.engine = engine
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.stopping = threading.Event()
+        self.listener = None
+        self.threads = []
+        self.clients = 0
+        self.connections = set()
+
+    def start(self):
+        if os.path.exists(self.socket_path):
+            # Left over by a server that did not shut down cleanly
+            os.unlink(self.socket_path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.socket_path)
+        self.listener.listen()
+        self.listener.settimeout(0.5)
+        for target in (self.accept_loop, self.batch_loop):
+            thread = threading.Thread(target=target, name=f"alpr-server-{target.__name__}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logger.info("Model server listening on %s.", self.socket_path)
+        return self
+
+    def stop(self, timeout=10):
+        self.stopping.set()
+        self.requests.put(None)
+        for thread in self.threads:
+            thread.join(timeout)
+        self.listener.close()
+        # Clients waiting on a reply see the connection close instead of timing out
+        for connection in list(self.connections):
+            try:
+                connection.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        logger.info("Model server stopped.")
+
+    def accept_loop(self):
+        while not self.stopping.is_set():
+            try:
+                sock, _ = self.listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.clients += 1
+            connection = Connection(sock, self.clients)
+            self.connections.add(connection)
+            threading.Thread(
+                target=self.read_loop, args=(connection,), name=f"alpr-server-client-{self.clients}", daemon=True
+            ).start()
+            logger.info("Client %d connected.", connection.client_id)
+
+    def read_loop(self, connection):
+        try:
+            while not self.stopping.is_set():
+                message = recv_message(connection.sock)
+                if message is None:
+                    break
+                self.requests.put((connection, message))
+        except (OSError, ValueError) as e:
+            logger.warning("Dropping client %d: %s", connection.client_id, e)
+        # The segments are released by the batching thread, which may still be using them
+        self.requests.put((connection, None))
+
+    def next_batch(self):
+        """
+        Wait for a request, then gather the ones arriving within max_wait, up to max_batch.
+
+        Returns:
+            list: (connection, message) pairs, message None for a closed connection, or
+                  None when the server is stopping.
+        """
+        first = self.requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self.requests.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def batch_loop(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                break
+            frames, closed = [], []
+            for connection, message in batch:
+                if message is None:
+                    closed.append(connection)
+                elif message.get("op") == "recognize":
+                    frames.append((connection, message))
+                else:
+                    connection.send({"id": message.get("id"), "ok": False,
+                                     "error": f"Unknown operation {message.get('op')!r}."})
+            if frames:
+                self.run_batch(frames)
+            for connection in closed:
+                connection.release_segments()
+                connection.sock.close()
+                self.connections.discard(connection)
+                logger.info("Client %d disconnected.", connection.client_id)
+
+    def run_batch(self, frames):
+        """
+        Recognize a batch of frames and send every client its result.
+        """
+        requests, images = [], []
+        for connection, message in frames:
+            try:
+                segment = connection.segment(message["shm"])
+                images.append(np.ndarray(message["shape"], dtype=message["dtype"], buffer=segment.buf))
+                requests.append((connection, message))
+            except (KeyError, TypeError, ValueError, OSError) as e:
+                connection.send({"id": message.get("id"), "ok": False, "error": f"Bad frame: {e}"})
+        if not requests:
+            return
+
+        start = time.perf_counter()
+        try:
+            results = self.engine.recognize_batch(images, [message.get("camera_id") for _, message in requests])
+        except Exception as e:
+            logger.error("Batch of %d frames failed: %s", len(images), e)
+            results = [e] * len(requests)
+        elapsed = time.perf_counter() - start
+        # The views must go before a segment can be closed
+        del images
+
+        metrics.observe("alpr_server_batch_size", len(requests), "Frames run together by the model server.")
+        metrics.record_stage("server_batch", elapsed)
+        for (connection, message), result in zip(requests, results):
+            if isinstance(result, Exception):
+                connection.send({"id": message.get("id"), "ok": False, "error": str(result)})
+                continue
+            connection.send({
+                "id": message.get("id"),
+                "ok": True,
+                "license_plate": result.license_plate,
+                "confidence": result.confidence,
+                "candidates": result.candidates,
+                "batch_size": len(requests),
+                "server_seconds": elapsed,
+            })
+
+
+class ModelClient:
+    """
+    Sends frames to a ModelServer and waits for their results, in place of a local ALPREngine.
+
+    Frames are written to a shared memory segment owned by the client, reused from one frame
+    to the next and only replaced when a larger frame arrives. Requests are synchronous, so
+    the segment is never rewritten while the server reads it. A client is not thread-safe;
+    give each thread its own.
+
+    When a request times out or the connection fails, the server may still be reading the
+    frame and its late reply would be taken for the next request's. The client then drops
+    both the connection and the segment, and reconnects with a fresh segment on the next
+    recognize(). The first connection is also made by recognize(), so a client can be created
+    before the server is up.
+    """
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=60):
+        """
+        Args:
+            socket_path (str): Path of the server's Unix domain socket.
+            timeout (float): Seconds to wait for a result before giving up.
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.sock = None
+        self.segment = None
+        self.next_id = 0
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise ModelServerError(f"Cannot reach the model server at {self.socket_path}: {e}")
+        self.sock = sock
+
+    def disconnect(self):
+        """
+        Drop the connection and the frame segment after a failed request.
+
+        The server unmaps the segment once it sees the connection close, and unlinking it
+        here only removes its name, so a frame still being read is never overwritten.
+        """
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        self.release_segment()
+
+    def frame_segment(self, size):
+        if self.segment is None or self.segment.size < size:
+            self.release_segment()
+            self.segment = shared_memory.SharedMemory(create=True, size=size)
+        return self.segment
+
+    def release_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment.unlink()
+            self.segment = None
+
+    def recognize(self, image, camera_id=None):
+        """
+        Recognize a frame on the server.
+
+        Args:
+            image (str or np.array): Path to the image, or the decoded image in BGR format.
+            camera_id (int, optional): Camera that captured the image.
+
+        Returns:
+            ALPRResult: The recognized license plate; batch_size and server_seconds are
+                        added as attributes.
+
+        Raises:
+            ModelServerError: The server is unreachable, failed the frame or did not answer
+                              in time. The frame was not recognized and can be retried.
+        """
+        import cv2
+        from alpr.engine import ALPRResult
+
+        image_path = image if isinstance(image, str) else None
+        if image_path is not None:
+            image = cv2.imread(image_path)
+            if image is None:
+                raise ValueError("Image path invalid or image format not supported.")
+        image = np.ascontiguousarray(image)
+
+        if self.sock is None:
+            self.connect()
+        segment = self.frame_segment(image.nbytes)
+        np.ndarray(image.shape, dtype=image.dtype, buffer=segment.buf)[...] = image
+        self.next_id += 1
+        try:
+            send_message(self.sock, {
+                "op": "recognize",
+                "id": self.next_id,
+                "shm": segment.name,
+                "shape": list(image.shape),
+                "dtype": image.dtype.str,
+                "camera_id": camera_id,
+            })
+            reply = recv_message(self.sock)
+        except (OSError, ValueError) as e:
+            # socket.timeout is an OSError
+            self.disconnect()
+            raise ModelServerError(f"Lost the connection to the model server: {e}")
+        if reply is None:
+            self.disconnect()
+            raise ModelServerError("The model server closed the connection.")
+        if reply.get("id") != self.next_id:
+            self.disconnect()
+            raise ModelServerError(f"Reply {reply.get('id')} does not match request {self.next_id}.")
+        if not reply["ok"]:
+            raise ModelServerError(reply["error"])
+
+        result = ALPRResult(reply["license_plate"], image_path, reply["confidence"], reply["candidates"])
+        result.batch_size = reply["batch_size"]
+        result.server_seconds = reply["server_seconds"]
+        return result
+
+    def close(self):
+        self.disconnect()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,6 +1,115 @@
+import os
+import sys
+import queue
+import atexit
+import logging
+import logging.handlers
+
 MODULE_WIDTH = 15
 verbose = 1
 debug = 1
+LOGGER_NAME = "alpr"
+_listener = None
+
+
+class ModuleFormatter(logging.Formatter):
+    """
+    Formats records like the original log() lines: the padded module name, then the message.
+    """
+    def __init__(self):
+        super().__init__(f"%(module_tag)-{MODULE_WIDTH}s | %(message)s")
+
+    def format(self, record):
+        record.module_tag = record.name.rsplit(".", 1)[-1]
+        return super().format(record)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that drops records instead of blocking when the queue is full, so a slow
+    stdout or disk never stalls the pipeline.
+    """
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level=None, stream=None, filename=None, use_queue=False, queue_size=10000):
+    """
+    Configure the handlers of every ALPR logger.
+
+    Args:
+        level (int or str, optional): Minimum level, defaults to $ALPR_LOG_LEVEL or INFO.
+        stream (file, optional): Stream to write to, defaults to stdout.
+        filename (str, optional): Also write the log to this file.
+        use_queue (bool): Hand records to a background thread through a bounded queue, so
+                          logging calls never wait on I/O. Records are dropped when full.
+        queue_size (int): Capacity of the queue.
+
+    Returns:
+        logging.Logger: The parent logger of the ALPR modules.
+    """
+    global _listener
+    stop_logging()
+
+    if level is None:
+        level = os.getenv("ALPR_LOG_LEVEL", "INFO")
+    root = logging.getLogger(LOGGER_NAME)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    root.propagate = False
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+    handlers = [logging.StreamHandler(stream or sys.stdout)]
+    if filename:
+        handlers.append(logging.FileHandler(filename))
+    for handler in handlers:
+        handler.setFormatter(ModuleFormatter())
+
+    if use_queue:
+        log_queue = queue.Queue(maxsize=queue_size)
+        root.addHandler(NonBlockingQueueHandler(log_queue))
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+    else:
+        for handler in handlers:
+            root.addHandler(handler)
+    return root
+
+
+def stop_logging():
+    """
+    Stop the queue listener, if any, after writing out the records still queued.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(module):
+    """
+    Return the logger of a module, configuring the default handler on first use.
+
+    Use %-style arguments, e.g. logger.debug("Detected %d contours.", n), so that messages
+    below the configured level are never formatted.
+
+    Args:
+        module (str): The name or context of the module, e.g. "RECTIFICATION".
+    """
+    if not logging.getLogger(LOGGER_NAME).handlers:
+        configure_logging()
+    return logging.getLogger(f"{LOGGER_NAME}.{module}")
+
+
 def add_bp(module, location):
     """
     Logs a debug breakpoint message if debugging is enabled.
@@ -11,18 +120,20 @@ def add_bp(module, location):
         debug (bool): Whether to output the debug message.
     """
     if debug:
-        print(f"{module:<{MODULE_WIDTH}} | Debug point at: {location}")
+        get_logger(module).debug("Debug point at: %s", location)
 
-def log(module, message):
+def log(module, message, *args, level=logging.INFO):
     """
     Logs a message with consistent formatting.
     
     Args:
         module (str): The name or context of the module.
-        message (str): The message to log.
+        message (str): The message to log, optionally with %-style placeholders.
+        *args: Values for the placeholders, only formatted if the message is emitted.
+        level (int): Logging level of the message.
     """
     if verbose: 
-        print(f"{module:<{MODULE_WIDTH}} | {message}")
+        get_logger(module).log(level, message, *args)
     
 def starter_log():
     koala_lines = [
@@ -0,0 +1,203 @@
+import os
+import sys
+import queue
+import select
+import struct
+import threading
+import time
+import ctypes
+import ctypes.util
+from alpr.utils import log
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class ImageWatcher:
+    """
+    Watch a folder for new images and feed their paths to a bounded queue.
+
+    On Linux the folder is watched with inotify for close-write and moved-to events, so a
+    file is only dispatched once its writer has closed it (pic_capture) or it has been
+    atomically renamed into place. If the kernel's event queue overflows during a burst,
+    the folder is scanned again. Elsewhere, or if inotify is unavailable, the folder is
+    polled and a file is only dispatched once its size and modification time have stopped
+    changing.
+    """
+    def __init__(self,
+                 folder,
+                 extensions=(".jpg", ".jpeg", ".png", ".bmp"),
+                 max_queued=64,
+                 use_inotify=True,
+                 poll_interval=1.0,
+                 settle_time=0.5):
+        """
+        Args:
+            folder (str): Directory to watch.
+            extensions (tuple[str]): Lower-case file extensions to dispatch.
+            max_queued (int): Capacity of the queue; the watcher blocks when it is full.
+            use_inotify (bool): Use inotify when available, otherwise always poll.
+            poll_interval (float): Seconds between scans in polling mode.
+            settle_time (float): Seconds a file must be left untouched before polling mode
+                                 dispatches it.
+        """
+        self.folder = folder
+        self.extensions = extensions
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.use_inotify = use_inotify
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.mode = None
+        self.stopped = threading.Event()
+        self.thread = None
+        self.fd = None
+
+    def is_image(self, filename):
+        return filename.lower().endswith(self.extensions)
+
+    def start(self):
+        """
+        Start watching. Images already in the folder are dispatched first.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        self.stopped.clear()
+        if self.use_inotify:
+            self.fd = self.open_inotify()
+        self.mode = "inotify" if self.fd is not None else "polling"
+        target = self.watch_inotify if self.fd is not None else self.watch_polling
+        self.thread = threading.Thread(target=target, name="image-watcher", daemon=True)
+        self.thread.start()
+        log("WATCHER", f"Watching {self.folder} using {self.mode}.")
+        return self
+
+    def stop(self):
+        """
+        Stop watching and wait for the watcher thread to exit.
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def get(self, timeout=None):
+        """
+        Return the path of the next image, or None if none arrived within timeout seconds.
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def dispatch(self, filename):
+        """
+        Put an image on the queue, waiting while the queue is full unless stopped.
+        """
+        path = os.path.join(self.folder, filename)
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(path, timeout=0.5)
+                log("WATCHER", f"Queued {filename}.")
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def open_inotify(self):
+        """
+        Create the inotify watch, or return None when inotify cannot be used.
+        """
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            wd = libc.inotify_add_watch(fd, os.fsencode(self.folder), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+            return fd
+        except (OSError, AttributeError) as e:
+            log("WATCHER", f"inotify unavailable, falling back to polling: {e}")
+            return None
+
+    def existing_images(self):
+        return sorted(
+            entry.name for entry in os.scandir(self.folder)
+            if entry.is_file() and self.is_image(entry.name)
+        )
+
+    def watch_inotify(self):
+        # Events are registered before the initial scan, so an image landing in between
+        # can be queued twice; the caller's processed ledger skips the duplicate.
+        for filename in self.existing_images():
+            if not self.dispatch(filename):
+                return
+
+        while not self.stopped.is_set():
+            readable, _, _ = select.select([self.fd], [], [], 0.5)
+            if not readable:
+                continue
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+
+            offset = 0
+            while offset < len(data):
+                _, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                filename = os.fsdecode(data[offset:offset + name_length].rstrip(b"\0"))
+                offset += name_length
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped; queue everything again, the processed ledger
+                    # skips the images that were already handled
+                    log("WATCHER", "inotify event queue overflowed, rescanning the folder.")
+                    for filename in self.existing_images():
+                        if not self.dispatch(filename):
+                            return
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and self.is_image(filename):
+                    if not self.dispatch(filename):
+                        return
+
+    def watch_polling(self):
+        dispatched = set()
+        pending = {}
+        while not self.stopped.is_set():
+            try:
+                entries = [entry for entry in os.scandir(self.folder)
+                           if entry.is_file() and self.is_image(entry.name)]
+            except OSError as e:
+                log("WATCHER", f"Failed to scan {self.folder}: {e}")
+                entries = []
+
+            now = time.time()
+            present = set()
+            for entry in sorted(entries, key=lambda e: e.name):
+                present.add(entry.name)
+                if entry.name in dispatched:
+                    continue
+                stat = entry.stat()
+                signature = (stat.st_size, stat.st_mtime)
+                # Only dispatch once the file stopped changing between two scans
+                if pending.get(entry.name) == signature and now - stat.st_mtime >= self.settle_time:
+                    del pending[entry.name]
+                    if not self.dispatch(entry.name):
+                        return
+                    dispatched.add(entry.name)
+                else:
+                    pending[entry.name] = signature
+
+            # Forget files that were removed so the bookkeeping does not grow forever
+            dispatched &= present
+            pending = {name: sig for name, sig in pending.items() if name in present}
+            self.stopped.wait(self.poll_interval)
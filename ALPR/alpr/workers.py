@@ -0,0 +1,288 @@
+import os
+import queue
+import signal
+import time
+import multiprocessing as mp
+from alpr import metrics
+from alpr.utils import log
+
+
+def worker_main(worker_id, engine_kwargs, tasks, results):
+    """
+    Entry point of a worker process: load the models once, then recognize frames from the
+    task queue until a None sentinel arrives.
+
+    SIGINT is ignored so that Ctrl+C only reaches the parent, which then shuts the pool down
+    gracefully and lets the worker finish the frames already queued.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from alpr.engine import ALPREngine
+
+    # Each worker exports its own metrics, told apart by a worker label
+    metrics.REGISTRY.constant_labels["worker"] = str(worker_id)
+    exporter = metrics.MetricsExporter(
+        metrics.REGISTRY,
+        worker_metrics_path(os.getenv("ALPR_METRICS_FILE"), worker_id),
+        worker_metrics_path(os.getenv("ALPR_METRICS_JSON"), worker_id),
+    ).start()
+
+    # Workers get their own session folder in case the engine runs in file mode
+    try:
+        engine = ALPREngine(**dict(engine_kwargs, session_number=worker_id))
+    except Exception as e:
+        log("WORKER", f"Worker {worker_id} could not load the models: {e}")
+        results.put(("init_error", worker_id, None, str(e)))
+        exporter.stop()
+        return
+    results.put(("ready", worker_id, None, engine.startup))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        image_path, camera_id = task
+        # Lets the parent hand the frame to another worker if this one dies on it
+        results.put(("started", worker_id, image_path, camera_id))
+        try:
+            results.put(("result", worker_id, image_path, engine.recognize(image_path, camera_id)))
+        except Exception as e:
+            log("WORKER", f"Worker {worker_id} failed on {image_path}: {e}")
+            results.put(("error", worker_id, image_path, str(e)))
+    engine.close()
+    exporter.stop()
+    log("WORKER", f"Worker {worker_id} stopped.")
+
+
+def worker_metrics_path(path, worker_id):
+    """
+    Insert the worker id before the extension, e.g. alpr.prom -> alpr-worker0.prom.
+    """
+    if not path:
+        return None
+    root, extension = os.path.splitext(path)
+    return f"{root}-worker{worker_id}{extension}"
+
+
+class WorkerPool:
+    """
+    A pool of worker processes, each holding its own ALPREngine, fed from one shared queue.
+
+    Results flow back through a single result queue so one writer (the parent) handles the
+    uploads and database inserts. The task queue is bounded: submit() blocks, or times out,
+    when every worker is busy and the queue is full.
+
+    get_result() also watches the workers. A worker that dies after loading its models is
+    respawned, up to max_restarts times, and the frame it was working on is queued again
+    once; a frame that already killed a worker is reported as an error. A worker that cannot
+    load its models is not respawned, and once no worker is left get_result() raises
+    RuntimeError.
+    """
+    def __init__(self, engine_kwargs, workers=2, max_queued=None, start_method="spawn", max_restarts=3,
+                 check_interval=1.0):
+        """
+        Args:
+            engine_kwargs (dict): Keyword arguments for ALPREngine in each worker.
+            workers (int): Number of worker processes.
+            max_queued (int, optional): Capacity of the task queue, defaults to 2 * workers.
+            start_method (str): Multiprocessing start method. "spawn" avoids forking a
+                                parent that already holds threads or model state.
+            max_restarts (int): Times each worker is respawned after dying.
+            check_interval (float): Seconds between two checks of the worker processes.
+        """
+        self.engine_kwargs = engine_kwargs
+        self.workers = workers
+        self.max_restarts = max_restarts
+        self.check_interval = check_interval
+        self.context = mp.get_context(start_method)
+        self.tasks = self.context.Queue(maxsize=max_queued or 2 * workers)
+        self.results = self.context.Queue()
+        self.processes = {}
+        self.ready = 0
+        self.started_at = None
+        # (frame, camera) each worker is working on, restarts per worker and results to hand out
+        self.assigned = {}
+        self.restarts = {}
+        self.retried = set()
+        self.pending = []
+        self.last_check = 0.0
+        self.stopping = False
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        for worker_id in range(self.workers):
+            self.spawn(worker_id)
+        log("WORKER", f"Started {self.workers} workers.")
+        return self
+
+    def spawn(self, worker_id):
+        process = self.context.Process(
+            target=worker_main,
+            args=(worker_id, self.engine_kwargs, self.tasks, self.results),
+            name=f"alpr-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[worker_id] = process
+
+    def submit(self, image_path, timeout=None, camera_id=None):
+        """
+        Queue an image for recognition.
+
+        Args:
+            image_path (str): Path of the image.
+            timeout (float, optional): Seconds to wait for room in the queue.
+            camera_id (int, optional): Camera that captured the image.
+
+        Returns:
+            bool: False if the queue stayed full for the whole timeout.
+        """
+        try:
+            self.tasks.put((image_path, camera_id), timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def get_result(self, timeout=None):
+        """
+        Return the next finished frame as (image_path, ALPRResult or None, error or None),
+        or None if nothing finished within timeout seconds.
+
+        Raises:
+            RuntimeError: Every worker died and none can be respawned.
+        """
+        while True:
+            # Also when results keep arriving, so a dead worker is not missed behind them
+            self.check_workers()
+            if self.pending:
+                return self.pending.pop(0)
+            try:
+                kind, worker_id, key, payload = self.results.get(timeout=timeout)
+            except queue.Empty:
+                self.check_workers()
+                if self.pending:
+                    return self.pending.pop(0)
+                return None
+            if kind == "ready":
+                self.ready += 1
+                self.log_ready(worker_id, payload)
+                continue
+            if kind == "init_error":
+                # Respawning would fail the same way, e.g. on a bad model path
+                self.restarts[worker_id] = self.max_restarts
+                continue
+            if kind == "started":
+                self.assigned[worker_id] = (key, payload)
+                continue
+            self.assigned.pop(worker_id, None)
+            if kind == "error":
+                return key, None, payload
+            return key, payload, None
+
+    def check_workers(self, force=False):
+        """
+        Respawn the workers that died and queue their frame again, at most every check_interval.
+        """
+        now = time.monotonic()
+        if self.stopping or (not force and now - self.last_check < self.check_interval):
+            return
+        self.last_check = now
+        for worker_id, process in list(self.processes.items()):
+            if process.is_alive():
+                continue
+            del self.processes[worker_id]
+            log("WORKER", f"Worker {worker_id} exited with code {process.exitcode}.")
+            task = self.assigned.pop(worker_id, None)
+            if task is not None:
+                self.requeue(*task, f"worker {worker_id} died with exit code {process.exitcode}")
+            if self.restarts.get(worker_id, 0) < self.max_restarts:
+                self.restarts[worker_id] = self.restarts.get(worker_id, 0) + 1
+                log("WORKER", f"Respawning worker {worker_id} ({self.restarts[worker_id]}/{self.max_restarts}).")
+                metrics.count("alpr_worker_restarts_total", "Worker processes respawned after dying.")
+                self.spawn(worker_id)
+        if not self.processes:
+            raise RuntimeError("Every worker process died.")
+
+    def requeue(self, image_path, camera_id, reason):
+        """
+        Give the frame of a dead worker one more try, with its camera, or report it as failed.
+        """
+        if image_path not in self.retried:
+            self.retried.add(image_path)
+            try:
+                self.tasks.put_nowait((image_path, camera_id))
+                log("WORKER", f"Queued {image_path} again, {reason}.")
+                return
+            except queue.Full:
+                pass
+        self.pending.append((image_path, None, reason))
+
+    def log_ready(self, worker_id, startup):
+        """
+        Report how long a worker took from the pool start to taking frames, split into the
+        process spawn and the engine startup.
+        """
+        spawn = time.perf_counter() - self.started_at
+        metrics.set_gauge("alpr_worker_spawn_seconds", spawn,
+                          "Seconds from the pool start until the worker was ready.", worker=str(worker_id))
+        log("WORKER", f"Worker {worker_id} ready after {spawn:.2f}s (import {startup['import']:.2f}s, "
+                      f"model load {startup['model_load']:.2f}s, warm-up {startup['warm_up']:.2f}s).")
+
+    def stop(self, timeout=30):
+        """
+        Let the workers finish the queued frames, then stop them.
+
+        Results keep being collected while waiting, since a worker cannot exit before its
+        results have been read from the queue. If the queue stays full, e.g. because the
+        workers are dead, the workers are terminated instead of waiting forever.
+
+        Args:
+            timeout (float): Seconds to wait for each worker before terminating it.
+
+        Returns:
+            list[tuple]: Results that arrived during shutdown, as returned by get_result(),
+                         and the frames that were dropped, as errors.
+        """
+        processes = list(self.processes.values())
+        # No respawns from here on
+        self.stopping = True
+        self.processes = {}
+        for _ in processes:
+            try:
+                self.tasks.put(None, timeout=timeout)
+            except queue.Full:
+                log("WORKER", "The task queue stayed full, terminating the workers.")
+                for process in processes:
+                    process.terminate()
+                break
+
+        pending = []
+        for process in processes:
+            deadline = time.monotonic() + timeout
+            while process.is_alive() and time.monotonic() < deadline:
+                result = self.get_result(timeout=0.1)
+                if result is not None:
+                    pending.append(result)
+            if process.is_alive():
+                log("WORKER", f"{process.name} did not stop in time, terminating.")
+                process.terminate()
+            process.join()
+
+        result = self.get_result(timeout=0.1)
+        while result is not None:
+            pending.append(result)
+            result = self.get_result(timeout=0.1)
+
+        # Frames still queued or being worked on by a terminated worker
+        for image_path, _ in self.assigned.values():
+            pending.append((image_path, None, "worker stopped before finishing the frame"))
+        self.assigned = {}
+        while True:
+            try:
+                task = self.tasks.get_nowait()
+            except queue.Empty:
+                break
+            if task is not None:
+                pending.append((task[0], None, "not processed before shutdown"))
+
+        log("WORKER", "All workers stopped.")
+        return pending
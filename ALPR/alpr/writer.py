@@ -0,0 +1,221 @@
+import os
+import time
+import uuid
+import random
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from alpr import metrics
+from alpr.utils import log
+
+
+def retry(operation, attempts=5, backoff=0.5, max_backoff=30.0, description="operation"):
+    """
+    Call operation until it succeeds, sleeping with exponential backoff and jitter between
+    attempts. The last exception is raised once all attempts failed.
+    """
+    for attempt in range(attempts):
+        try:
+            return operation()
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            delay = min(backoff * (2 ** attempt), max_backoff) * random.uniform(0.5, 1.0)
+            log("WRITER", f"{description} failed ({e}), retrying in {delay:.1f}s.")
+            time.sleep(delay)
+
+
+class SupabaseWriter:
+    """
+    Background writer that keeps Supabase uploads and inserts off the recognition loop.
+
+    Each submitted event uploads its image on a bounded thread pool, then its row joins a
+    batch that is inserted into the table with a single request once batch_size rows are
+    waiting or flush_interval has elapsed. Every network call is retried with exponential
+    backoff. submit() returns a Future resolved with the inserted row, and flush() waits
+    for everything submitted so far.
+
+    The client is any object with the supabase-py storage/table interface. demo/supabase_standin.py
+    serves the endpoints it uses locally, and its check subcommand runs the writer against them.
+    """
+    def __init__(self,
+                 client,
+                 bucket_name="pictures",
+                 table="OccupancyEvent",
+                 max_concurrency=4,
+                 batch_size=20,
+                 flush_interval=1.0,
+                 max_pending=256,
+                 attempts=5,
+                 backoff=0.5):
+        """
+        Args:
+            client: Supabase client.
+            bucket_name (str): Storage bucket for the images.
+            table (str): Table receiving the events.
+            max_concurrency (int): Uploads running at the same time.
+            batch_size (int): Rows inserted per request.
+            flush_interval (float): Maximum seconds a row waits for its batch to fill.
+            max_pending (int): Events in flight before submit() blocks.
+            attempts (int): Attempts per network call before giving up.
+            backoff (float): Initial retry delay in seconds, doubled on every attempt.
+        """
+        self.client = client
+        self.bucket_name = bucket_name
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.attempts = attempts
+        self.backoff = backoff
+
+        self.uploads = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="supabase-upload")
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.condition = threading.Condition()
+        self.rows = []
+        self.outstanding = 0
+        self.uploading = 0
+        self.flushing = 0
+        self.stopping = False
+        self.inserter = threading.Thread(target=self.insert_loop, name="supabase-insert", daemon=True)
+        self.inserter.start()
+
+    def submit(self, image_path, license_plate, camera_id=1):
+        """
+        Queue an event for upload and insertion. Blocks while max_pending events are in flight.
+
+        Args:
+            image_path (str): Path of the image to upload.
+            license_plate (str): The recognized license plate.
+            camera_id (int): ID of the camera that captured the image.
+
+        Returns:
+            Future: Resolved with the row inserted, or with the exception that stopped it.
+        """
+        if self.stopping:
+            raise RuntimeError("SupabaseWriter is stopped.")
+        self.slots.acquire()
+        future = Future()
+        with self.condition:
+            self.outstanding += 1
+            self.uploading += 1
+        future.add_done_callback(self.release)
+        self.uploads.submit(self.upload, image_path, license_plate, camera_id, future)
+        return future
+
+    def release(self, future):
+        self.slots.release()
+        with self.condition:
+            self.outstanding -= 1
+            self.condition.notify_all()
+
+    def upload(self, image_path, license_plate, camera_id, future):
+        """
+        Upload the image and hand the row over to the insert batcher.
+        """
+        try:
+            with open(image_path, "rb") as f:
+                file_data = f.read()
+            file_name = f"{uuid.uuid4()}{os.path.splitext(image_path)[1]}"
+            bucket = self.client.storage.from_(self.bucket_name)
+
+            with metrics.stage_timer("upload"):
+                retry(lambda: bucket.upload(file_name, file_data, {"content-type": "image/jpeg"}),
+                      self.attempts, self.backoff, description=f"Upload of {image_path}")
+            image_url = retry(lambda: bucket.get_public_url(file_name),
+                              self.attempts, self.backoff, description="Public URL lookup")
+            log("WRITER", f"Image uploaded to Supabase: {image_url}")
+        except Exception as e:
+            log("WRITER", f"Error uploading to Supabase: {str(e)}")
+            metrics.count("alpr_events_total", "OccupancyEvents by outcome.", outcome="upload_failed")
+            with self.condition:
+                self.uploading -= 1
+                self.condition.notify_all()
+            future.set_exception(e)
+            return
+
+        row = {
+            "license_plate": license_plate,
+            "status": "Unprocessed",
+            "cameraId": camera_id,
+            "image": image_url,
+        }
+        with self.condition:
+            self.uploading -= 1
+            self.rows.append((row, future))
+            self.condition.notify_all()
+
+    def insert_loop(self):
+        while True:
+            with self.condition:
+                deadline = None
+                # Wait for a full batch or the flush interval. When flushing or stopping, the
+                # batch is sent as soon as no upload is left to join it.
+                while not (self.rows and (len(self.rows) >= self.batch_size or self.draining())):
+                    if self.stopping and self.outstanding == 0:
+                        return
+                    if not self.rows:
+                        deadline = None
+                        self.condition.wait(self.flush_interval)
+                        continue
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch, self.rows = self.rows[:self.batch_size], self.rows[self.batch_size:]
+            self.insert(batch)
+
+    def draining(self):
+        return (self.flushing or self.stopping) and self.uploading == 0
+
+    def insert(self, batch):
+        rows = [row for row, _ in batch]
+        try:
+            with metrics.stage_timer("insert"):
+                retry(lambda: self.client.table(self.table).insert(rows).execute(),
+                      self.attempts, self.backoff, description=f"Insert of {len(rows)} rows")
+            log("WRITER", f"Data saved to database: {[row['license_plate'] for row in rows]}")
+        except Exception as e:
+            log("WRITER", f"Error saving to database: {str(e)}")
+            metrics.count("alpr_events_total", "OccupancyEvents by outcome.", outcome="insert_failed", amount=len(rows))
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        metrics.count("alpr_events_total", "OccupancyEvents by outcome.", outcome="written", amount=len(rows))
+        for row, future in batch:
+            future.set_result(row)
+
+    def flush(self, timeout=None):
+        """
+        Wait until every event submitted so far has been inserted or has failed.
+
+        Returns:
+            bool: False if events were still in flight when the timeout expired.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            # Rows waiting for their batch to fill are inserted right away
+            self.flushing += 1
+            self.condition.notify_all()
+            try:
+                while self.outstanding:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self.condition.wait(remaining)
+            finally:
+                self.flushing -= 1
+        return True
+
+    def stop(self, timeout=None):
+        """
+        Flush the pending events and stop the background threads.
+        """
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        self.uploads.shutdown(wait=True)
+        self.inserter.join(timeout)
+        flushed = self.outstanding == 0
+        log("WRITER", "Supabase writer stopped.")
+        return flushed
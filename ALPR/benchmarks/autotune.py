@@ -0,0 +1,149 @@
+"""
+Find the cheapest pipeline configurations that still read a labelled image set correctly.
+
+Every combination of crop padding levels, segmentation padding levels and rectification
+power level is run over the images, measuring accuracy against labels.json and the mean
+time per image. The Pareto-optimal configurations (no other one is both cheaper and at
+least as accurate) are written as engine config files, loadable with
+ALPREngine.from_config() or ALPR_CONFIG for demo/alpr_top.py.
+
+Usage:
+    python benchmarks/autotune.py --images ./labelled --output ./configs --target 0.95
+    python benchmarks/autotune.py --synthetic 50 --power-levels 0 3
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import tempfile
+
+# Add the project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from alpr.engine import ALPREngine
+from alpr.utils import configure_logging
+from run_benchmarks import load_images, load_labels
+from synthetic import generate_dataset
+
+DEFAULT_CROP_PADDINGS = [[0], [0, 10], [-5, 0, 10], [-5, -10, 0, 10, 20]]
+DEFAULT_SEGMENTATION_PADDINGS = [[0], [0, 5], [-2, 0, 5], [-5, -2, 0, 5, 10, 20]]
+DEFAULT_POWER_LEVELS = [0, 1, 2, 3]
+
+
+def evaluate(engine, images, labels, params):
+    """
+    Run the labelled images through the engine configured with params.
+
+    Returns:
+        dict: Accuracy, mean seconds and mean candidates read per image.
+    """
+    engine.cropped_paddings = params["cropped_paddings"]
+    engine.segmenter.padding_levels = params["segmentation_padding_levels"]
+    engine.rectifier.power_level = params["power_level"]
+
+    correct, candidates = 0, 0
+    start = time.perf_counter()
+    for file_name, image in images:
+        result = engine.recognize(image)
+        correct += result.license_plate == labels[file_name]
+        candidates += result.candidates
+    elapsed = time.perf_counter() - start
+    return {
+        "accuracy": correct / len(images),
+        "seconds_per_image": elapsed / len(images),
+        "candidates_per_image": candidates / len(images),
+    }
+
+
+def pareto_front(results):
+    """
+    Keep the configurations that no other configuration beats on both cost and accuracy.
+
+    Returns:
+        list[dict]: The front, from cheapest to most accurate.
+    """
+    front, best_accuracy = [], -1.0
+    for result in sorted(results, key=lambda r: (r["measured"]["seconds_per_image"], -r["measured"]["accuracy"])):
+        if result["measured"]["accuracy"] > best_accuracy:
+            front.append(result)
+            best_accuracy = result["measured"]["accuracy"]
+    return front
+
+
+def write_config(path, result):
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the ALPR pipeline parameters on labelled images.")
+    parser.add_argument("--images", default=None, help="Folder of images with a labels.json.")
+    parser.add_argument("--synthetic", type=int, default=0, help="Tune on this many generated plates instead.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic plates.")
+    parser.add_argument("--crop-paddings", type=json.loads, default=DEFAULT_CROP_PADDINGS,
+                        help="JSON list of crop padding level lists to try.")
+    parser.add_argument("--segmentation-paddings", type=json.loads, default=DEFAULT_SEGMENTATION_PADDINGS,
+                        help="JSON list of segmentation padding level lists to try.")
+    parser.add_argument("--power-levels", type=int, nargs="+", default=DEFAULT_POWER_LEVELS,
+                        help="Rectification power levels to try.")
+    parser.add_argument("--target", type=float, default=None,
+                        help="Accuracy target; the cheapest configuration meeting it is written as best.json.")
+    parser.add_argument("--localisation-model", default="./models/localisation_model.pt")
+    parser.add_argument("--segmentation-model", default="./models/segmentation_model.pt")
+    parser.add_argument("--sr-model", default="./models/LapSRN_x2.pb")
+    parser.add_argument("--output", default="./benchmarks/configs", help="Directory for the config files.")
+    args = parser.parse_args()
+
+    configure_logging("WARNING")
+
+    if args.synthetic:
+        folder = tempfile.mkdtemp(prefix="alpr_synthetic_")
+        generate_dataset(folder, args.synthetic, args.seed)
+    elif args.images:
+        folder = args.images
+    else:
+        sys.exit("Pass --images with a labels.json, or --synthetic.")
+
+    labels = load_labels(folder)
+    images = [(name, image) for name, image in load_images(folder) if name in labels]
+    if not images:
+        sys.exit(f"No labelled images found in {folder}")
+
+    engine = ALPREngine(args.localisation_model, args.segmentation_model, args.sr_model)
+
+    grid = list(itertools.product(args.crop_paddings, args.segmentation_paddings, args.power_levels))
+    results = []
+    for idx, (cropped_paddings, segmentation_paddings, power_level) in enumerate(grid):
+        params = {
+            "cropped_paddings": cropped_paddings,
+            "segmentation_padding_levels": segmentation_paddings,
+            "power_level": power_level,
+        }
+        measured = evaluate(engine, images, labels, params)
+        results.append({"engine": params, "measured": measured})
+        print(f"[{idx + 1}/{len(grid)}] {params} -> accuracy {measured['accuracy']:.3f}, "
+              f"{measured['seconds_per_image'] * 1000:.0f} ms/image")
+
+    os.makedirs(args.output, exist_ok=True)
+    front = pareto_front(results)
+    for idx, result in enumerate(front):
+        write_config(os.path.join(args.output, f"pareto_{idx}.json"), result)
+    with open(os.path.join(args.output, "results.json"), "w") as f:
+        json.dump({"images": len(images), "results": results, "pareto": front}, f, indent=2)
+    print(f"{len(front)} Pareto-optimal configurations written to {args.output}")
+
+    if args.target is not None:
+        meeting = [result for result in front if result["measured"]["accuracy"] >= args.target]
+        if meeting:
+            write_config(os.path.join(args.output, "best.json"), meeting[0])
+            print(f"Cheapest configuration meeting {args.target:.2f}: {meeting[0]['engine']}")
+        else:
+            print(f"No configuration reached an accuracy of {args.target:.2f}.")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Compare benchmark results against a baseline and fail on regressions.
+
+Throughput may drop, and p95 latency and peak RSS may grow, by at most the given fractions.
+The exit status is 1 when any threshold is exceeded, so the script can gate a CI job.
+
+Usage:
+    python benchmarks/compare.py baseline.json results.json --throughput 0.10 --latency 0.15
+"""
+import sys
+import json
+import argparse
+
+
+def relative_change(baseline, current):
+    if baseline in (None, 0) or current is None:
+        return None
+    return (current - baseline) / baseline
+
+
+def compare(baseline, current, throughput=0.10, latency=0.15, memory=0.20, accuracy=0.02):
+    """
+    Check the current results against the baseline.
+
+    Args:
+        baseline (dict): Results of run_benchmarks.py used as reference.
+        current (dict): Results to check.
+        throughput (float): Allowed relative drop of images/s.
+        latency (float): Allowed relative growth of p95 latencies, pipeline and stages.
+        memory (float): Allowed relative growth of peak RSS.
+        accuracy (float): Allowed absolute drop of accuracy on labelled images.
+
+    Returns:
+        list[tuple]: (metric, baseline, current, change, ok) for every compared metric.
+    """
+    checks = []
+
+    def check(name, base, value, limit, higher_is_better=False, absolute=False):
+        change = (value - base if base is not None and value is not None else None) if absolute \
+            else relative_change(base, value)
+        if change is None:
+            return
+        ok = change >= -limit if higher_is_better else change <= limit
+        checks.append((name, base, value, change, ok))
+
+    base_pipeline, pipeline = baseline["pipeline"], current["pipeline"]
+    check("images_per_second", base_pipeline["images_per_second"], pipeline["images_per_second"],
+          throughput, higher_is_better=True)
+    check("pipeline_p95", base_pipeline["latency"]["p95"], pipeline["latency"]["p95"], latency)
+    check("peak_rss_mb", baseline["peak_rss_mb"], current["peak_rss_mb"], memory)
+    check("accuracy", base_pipeline.get("accuracy"), pipeline.get("accuracy"), accuracy,
+          higher_is_better=True, absolute=True)
+
+    for stage, summary in (baseline.get("stages") or {}).items():
+        current_summary = (current.get("stages") or {}).get(stage)
+        if current_summary:
+            check(f"{stage}_p95", summary["p95"], current_summary["p95"], latency)
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare benchmark results against a baseline.")
+    parser.add_argument("baseline", help="Baseline results JSON.")
+    parser.add_argument("current", help="Current results JSON.")
+    parser.add_argument("--throughput", type=float, default=0.10, help="Allowed relative drop of images/s.")
+    parser.add_argument("--latency", type=float, default=0.15, help="Allowed relative growth of p95 latency.")
+    parser.add_argument("--memory", type=float, default=0.20, help="Allowed relative growth of peak RSS.")
+    parser.add_argument("--accuracy", type=float, default=0.02, help="Allowed absolute drop of accuracy.")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    if baseline["config"] != current["config"]:
+        print("Warning: the configurations differ, the comparison may not be meaningful.")
+
+    checks = compare(baseline, current, args.throughput, args.latency, args.memory, args.accuracy)
+    for name, base, value, change, ok in checks:
+        status = "ok" if ok else "REGRESSION"
+        print(f"{name:<24} {base:>12.4f} -> {value:>12.4f} ({change:+.1%})  {status}")
+
+    if not all(ok for *_, ok in checks):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
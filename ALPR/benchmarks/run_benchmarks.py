@@ -0,0 +1,256 @@
+"""
+Benchmark each ALPR stage and the full pipeline over a folder of images.
+
+The configuration (crop padding levels, rectification power level, models) is fixed by the
+command line and recorded in the results, together with images/s, p50/p95 latency, peak RSS
+and the time spent in each stage. Results are written as JSON so that compare.py can check
+them against a baseline.
+
+Usage:
+    python benchmarks/run_benchmarks.py --images demo/input --output results.json
+    python benchmarks/run_benchmarks.py --synthetic 50 --output results.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import cv2
+import numpy as np
+
+# Add the project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from alpr import metrics
+from alpr.engine import ALPREngine
+from alpr.utils import configure_logging
+from synthetic import generate_dataset
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def summarize(latencies):
+    """
+    Count, mean, p50, p95 and total of a list of latencies in seconds.
+    """
+    if not latencies:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "total": 0.0}
+    values = np.asarray(latencies)
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "total": float(values.sum()),
+    }
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MiB (ru_maxrss is in KiB on Linux, bytes on macOS).
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def load_images(folder):
+    """
+    Return (file name, BGR image) for every readable image in folder, sorted by name.
+    """
+    images = []
+    for file_name in sorted(os.listdir(folder)):
+        if not file_name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        image = cv2.imread(os.path.join(folder, file_name))
+        if image is not None:
+            images.append((file_name, image))
+    return images
+
+
+def load_labels(folder):
+    """
+    Ground truth plates from labels.json in folder, or an empty dict.
+    """
+    path = os.path.join(folder, "labels.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_stages(engine, images, repeats=1):
+    """
+    Run every stage on its own, feeding it the outputs of the previous stage.
+
+    Returns:
+        dict: Latency summary per stage. Localisation, super-resolution and segmentation
+              are timed per image, rectification per cropped plate.
+    """
+    latencies = {"localisation": [], "super_resolution": [], "rectification": [], "segmentation": []}
+    segmentation_dims = (engine.segmenter.input_width, engine.segmenter.input_height)
+    for _ in range(repeats):
+        for _, image in images:
+            crops, elapsed = timed(engine.localiser.crop_plates, image, engine.cropped_paddings)
+            latencies["localisation"].append(elapsed)
+            crops = [crop for _, _, crop in crops]
+            if not crops:
+                continue
+
+            # No cache keys, so every crop needing super-resolution pays for it
+            _, elapsed = timed(engine.upscaler.upscale_batch, crops, segmentation_dims)
+            latencies["super_resolution"].append(elapsed)
+
+            for crop in crops:
+                _, elapsed = timed(engine.rectifier.rectify_candidates, crop)
+                latencies["rectification"].append(elapsed)
+
+            engine.segmenter.reset()
+            _, elapsed = timed(engine.segmenter.segment_batch, crops)
+            latencies["segmentation"].append(elapsed)
+            engine.upscaler.end_frame()
+    return {stage: summarize(values) for stage, values in latencies.items()}
+
+
+def stage_breakdown(frames):
+    """
+    Mean time per frame spent in each stage during the pipeline run, from the metrics registry.
+    """
+    snapshot = metrics.REGISTRY.to_json().get(metrics.STAGE_SECONDS, {"series": []})
+    breakdown = {}
+    for series in snapshot["series"]:
+        stage = series["labels"].get("stage")
+        total = series["value"]["sum"]
+        breakdown[stage] = {
+            "calls": series["value"]["count"],
+            "seconds_per_frame": total / frames if frames else None,
+        }
+    frame_seconds = breakdown.get("frame", {}).get("seconds_per_frame")
+    for stage, values in breakdown.items():
+        if frame_seconds and values["seconds_per_frame"] is not None:
+            values["share_of_frame"] = values["seconds_per_frame"] / frame_seconds
+    return breakdown
+
+
+def bench_pipeline(engine, images, labels, repeats=1):
+    """
+    Run the full pipeline on every image.
+
+    Returns:
+        dict: Throughput, latency summary, stage breakdown and, for labelled images, accuracy.
+    """
+    metrics.REGISTRY.reset()
+    latencies, correct, labelled = [], 0, 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for file_name, image in images:
+            result, elapsed = timed(engine.recognize, image)
+            latencies.append(elapsed)
+            if file_name in labels:
+                labelled += 1
+                correct += result.license_plate == labels[file_name]
+    wall = time.perf_counter() - start
+
+    return {
+        "images": len(latencies),
+        "images_per_second": len(latencies) / wall if wall else None,
+        "latency": summarize(latencies),
+        "stages": stage_breakdown(len(latencies)),
+        "accuracy": correct / labelled if labelled else None,
+    }
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ALPR pipeline.")
+    parser.add_argument("--images", default="./demo/input", help="Folder of input images.")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Benchmark this many generated plates instead of --images.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic plates.")
+    parser.add_argument("--padding-levels", type=int, nargs="+", default=[-5, -10, 0, 10, 20],
+                        help="Crop padding levels of the engine.")
+    parser.add_argument("--power-level", type=int, default=3, help="Rectification threshold power level.")
+    parser.add_argument("--repeats", type=int, default=1, help="Passes over the images.")
+    parser.add_argument("--skip-stages", action="store_true", help="Only benchmark the full pipeline.")
+    parser.add_argument("--localisation-model", default="./models/localisation_model.pt")
+    parser.add_argument("--segmentation-model", default="./models/segmentation_model.pt")
+    parser.add_argument("--sr-model", default="./models/LapSRN_x2.pb")
+    parser.add_argument("--output", default="./benchmarks/results.json", help="Where to write the results.")
+    args = parser.parse_args()
+
+    # Logging would dominate the timings
+    configure_logging("WARNING")
+
+    if args.synthetic:
+        folder = tempfile.mkdtemp(prefix="alpr_synthetic_")
+        generate_dataset(folder, args.synthetic, args.seed)
+    else:
+        folder = args.images
+    images = load_images(folder)
+    labels = load_labels(folder)
+    if not images:
+        sys.exit(f"No images found in {folder}")
+
+    load_start = time.perf_counter()
+    engine = ALPREngine(
+        args.localisation_model,
+        args.segmentation_model,
+        args.sr_model,
+        cropped_paddings=args.padding_levels,
+    )
+    engine.rectifier.power_level = args.power_level
+    load_seconds = time.perf_counter() - load_start
+
+    results = {
+        "config": {
+            "images": None if args.synthetic else os.path.abspath(folder),
+            "synthetic": args.synthetic,
+            "seed": args.seed,
+            "padding_levels": args.padding_levels,
+            "segmentation_padding_levels": engine.segmenter.padding_levels,
+            "power_level": args.power_level,
+            "repeats": args.repeats,
+            "models": [args.localisation_model, args.segmentation_model, args.sr_model],
+        },
+        "environment": environment(),
+        "model_load_seconds": load_seconds,
+        "startup": engine.startup,
+        "stages": None if args.skip_stages else bench_stages(engine, images, args.repeats),
+        "pipeline": bench_pipeline(engine, images, labels, args.repeats),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    pipeline = results["pipeline"]
+    print(f"{pipeline['images']} images | {pipeline['images_per_second']:.2f} images/s | "
+          f"p50 {pipeline['latency']['p50'] * 1000:.0f} ms | p95 {pipeline['latency']['p95'] * 1000:.0f} ms | "
+          f"peak RSS {results['peak_rss_mb']:.0f} MiB")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Check that importing the alpr package stays fast and does not pull in the inference frameworks.
+
+The modules are imported in a fresh interpreter with `python -X importtime`. The script prints
+the slowest imports and exits with status 1 when the import takes longer than the budget, or
+when a heavy framework (TensorFlow, PyTorch, ultralytics, ONNX Runtime, OpenVINO) is imported
+before any model is loaded. With --engine it also loads the models and prints the engine's
+startup breakdown (import, model load, warm-up).
+
+Usage:
+    python benchmarks/startup.py --budget 1.5
+    python benchmarks/startup.py --engine --engine-budget 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+# Add the project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+MODULES = ["alpr.engine", "alpr.workers", "alpr.writer", "alpr.ledger", "alpr.dedupe", "alpr.watcher", "alpr.ocr"]
+HEAVY_MODULES = ["tensorflow", "torch", "ultralytics", "onnxruntime", "openvino"]
+
+
+def measure_imports(modules):
+    """
+    Import the modules in a fresh interpreter.
+
+    Returns:
+        tuple: (wall seconds, heavy modules that got imported,
+                list of (cumulative seconds, module) from -X importtime).
+    """
+    code = (
+        "import sys, json, time\n"
+        "start = time.perf_counter()\n"
+        f"import {', '.join(modules)}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps([elapsed, [m for m in {HEAVY_MODULES!r} if m in sys.modules]]))\n"
+    )
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=project_root, capture_output=True, text=True,
+    )
+    if process.returncode != 0:
+        sys.exit(f"Importing the modules failed:\n{process.stderr}")
+    elapsed, heavy = json.loads(process.stdout.strip().splitlines()[-1])
+
+    imports = []
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imports.append((int(cumulative) / 1e6, name.strip()))
+    return elapsed, heavy, imports
+
+
+def measure_engine(args):
+    from alpr.engine import ALPREngine
+    from alpr.utils import configure_logging
+
+    configure_logging("WARNING")
+    start = time.perf_counter()
+    engine = ALPREngine(args.localisation_model, args.segmentation_model, args.sr_model,
+                        detector_backend=args.backend)
+    return time.perf_counter() - start, engine.startup
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the startup time of the alpr package.")
+    parser.add_argument("--budget", type=float, default=1.5, help="Seconds the imports may take.")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to print.")
+    parser.add_argument("--engine", action="store_true", help="Also load the models and time the engine startup.")
+    parser.add_argument("--engine-budget", type=float, default=None, help="Seconds the engine startup may take.")
+    parser.add_argument("--backend", default="auto", help="Detector backend of the engine.")
+    parser.add_argument("--localisation-model", default="./models/localisation_model.pt")
+    parser.add_argument("--segmentation-model", default="./models/segmentation_model.pt")
+    parser.add_argument("--sr-model", default="./models/LapSRN_x2.pb")
+    args = parser.parse_args()
+
+    failed = False
+    elapsed, heavy, imports = measure_imports(MODULES)
+    print(f"Importing {', '.join(MODULES)} took {elapsed:.2f}s (budget {args.budget:.2f}s)")
+    for cumulative, name in sorted(imports, reverse=True)[:args.top]:
+        print(f"  {cumulative:8.3f}s  {name}")
+    if elapsed > args.budget:
+        print("Import time is over budget.")
+        failed = True
+    if heavy:
+        print(f"Heavy frameworks imported before any model is loaded: {', '.join(heavy)}")
+        failed = True
+
+    if args.engine:
+        wall, startup = measure_engine(args)
+        print(f"Engine startup took {wall:.2f}s:")
+        for phase, seconds in startup.items():
+            print(f"  {phase:<22} {seconds:8.3f}s")
+        if args.engine_budget is not None and wall > args.engine_budget:
+            print("Engine startup is over budget.")
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Generate a reproducible set of synthetic license plate images with their ground truth.
+
+Each image is a white plate with dark characters, warped into a random perspective and
+pasted onto a noisy background. The labels are written to labels.json as
+{"file name": "PLATE"}, which is the format run_benchmarks.py and the autotuner read.
+
+Usage:
+    python benchmarks/synthetic.py ./benchmarks/synthetic --count 50 --seed 0
+"""
+import os
+import json
+import argparse
+import cv2
+import numpy as np
+
+# Same alphabet as the OCR model, which has no O to avoid confusing it with 0
+LETTERS = "ABCDEFGHIJKLMNPQRSTUVWXYZ"
+DIGITS = "0123456789"
+
+
+def random_plate_text(rng):
+    """
+    Return a plate string such as ABC123 or 1ABC234.
+    """
+    if rng.random() < 0.5:
+        parts = [rng.choice(list(LETTERS), 3), rng.choice(list(DIGITS), 3)]
+    else:
+        parts = [rng.choice(list(DIGITS), 1), rng.choice(list(LETTERS), 3), rng.choice(list(DIGITS), 3)]
+    return "".join("".join(part) for part in parts)
+
+
+def render_plate(text, plate_size=(520, 110)):
+    """
+    Draw the plate: white background, dark border and centred characters.
+    """
+    width, height = plate_size
+    plate = np.full((height, width, 3), 245, dtype=np.uint8)
+    cv2.rectangle(plate, (3, 3), (width - 4, height - 4), (30, 30, 30), 4)
+    font, scale, thickness = cv2.FONT_HERSHEY_DUPLEX, 2.6, 6
+    (text_w, text_h), _ = cv2.getTextSize(text, font, scale, thickness)
+    origin = ((width - text_w) // 2, (height + text_h) // 2)
+    cv2.putText(plate, text, origin, font, scale, (20, 20, 20), thickness, cv2.LINE_AA)
+    return plate
+
+
+def generate_image(text, rng, image_size=(1280, 720)):
+    """
+    Place a rendered plate into a scene with a random perspective, blur and noise.
+
+    Returns:
+        np.array: The scene in BGR format.
+    """
+    width, height = image_size
+    scene = rng.integers(40, 120, size=(height, width, 3), dtype=np.uint8)
+    scene = cv2.GaussianBlur(scene, (31, 31), 0)
+
+    plate = render_plate(text)
+    plate_h, plate_w = plate.shape[:2]
+    scale = rng.uniform(0.35, 0.8)
+    target_w, target_h = plate_w * scale, plate_h * scale
+    x = rng.uniform(0.1 * width, 0.9 * width - target_w)
+    y = rng.uniform(0.3 * height, 0.9 * height - target_h)
+    jitter = 0.08 * target_w
+    corners = np.float32([
+        [x, y], [x + target_w, y], [x + target_w, y + target_h], [x, y + target_h]
+    ]) + rng.uniform(-jitter, jitter, size=(4, 2)).astype(np.float32)
+    source = np.float32([[0, 0], [plate_w, 0], [plate_w, plate_h], [0, plate_h]])
+    H = cv2.getPerspectiveTransform(source, corners)
+
+    warped = cv2.warpPerspective(plate, H, (width, height))
+    mask = cv2.warpPerspective(np.full((plate_h, plate_w), 255, dtype=np.uint8), H, (width, height))
+    scene[mask > 0] = warped[mask > 0]
+
+    scene = cv2.GaussianBlur(scene, (3, 3), rng.uniform(0.1, 1.2))
+    noise = rng.normal(0, rng.uniform(2, 8), size=scene.shape)
+    return np.clip(scene.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+
+
+def generate_dataset(output_dir, count=50, seed=0):
+    """
+    Write count synthetic images and labels.json to output_dir.
+
+    Returns:
+        dict: Ground truth plate per file name.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    labels = {}
+    for idx in range(count):
+        text = random_plate_text(rng)
+        file_name = f"synthetic_{idx:04d}.jpg"
+        cv2.imwrite(os.path.join(output_dir, file_name), generate_image(text, rng))
+        labels[file_name] = text
+    with open(os.path.join(output_dir, "labels.json"), "w") as f:
+        json.dump(labels, f, indent=2)
+    return labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic license plate images.")
+    parser.add_argument("output_dir", help="Directory receiving the images and labels.json.")
+    parser.add_argument("--count", type=int, default=50, help="Number of images.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed, the same seed gives the same images.")
+    args = parser.parse_args()
+    generate_dataset(args.output_dir, args.count, args.seed)
+    print(f"Wrote {args.count} images to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,6 @@ import sys
 import shutil
 import time
 import signal
-import uuid
 from datetime import datetime
 from supabase import create_client, Client
 from dotenv import load_dotenv
@@ -13,12 +12,16 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, project_root)
 
 # Import our modularized ALPR classes
-from alpr.localisation import Localisation
-from alpr.rectification import Rectification
-from alpr.segmentation import Segmentation
-from alpr.ocr import OCR
-from alpr.upscaler import Upscaler
-from alpr.utils import starter_log, log, add_bp, test_manager
+from alpr import metrics
+from alpr.engine import ALPREngine, load_engine_config
+from alpr.localisation import load_camera_regions, find_region
+from alpr.watcher import ImageWatcher
+from alpr.workers import WorkerPool
+from alpr.server import ModelClient, ModelServerError
+from alpr.writer import SupabaseWriter
+from alpr.ledger import ProcessedLedger, hash_file
+from alpr.dedupe import FrameDeduplicator, EventDeduplicator, dhash_file, log_dedupe_stats
+from alpr.utils import starter_log, log, add_bp, configure_logging, stop_logging
 
 load_dotenv()
 
@@ -32,6 +35,10 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)  # type: ignore
 # Flag to control the continuous processing
 running = True
 
+# Seconds to wait before retrying an image the model server failed, doubling up to the maximum
+SERVER_BACKOFF = 1.0
+MAX_SERVER_BACKOFF = 30.0
+
 
 def signal_handler(sig, frame):
     """Handle Ctrl+C gracefully"""
@@ -63,155 +70,206 @@ def ensure_and_clear_folder(folder_path):
                 log("TOP", f"Failed to delete {file_path}. Reason: {e}")
 
 
-def upload_to_supabase(image_path, bucket_name="pictures"):
+def process_images(input_dir, engine, camera_id=1):
     """
-    Uploads an image to Supabase storage and returns the URL.
+    Processes images using the ALPR pipeline by performing:
+      - Localisation (plate detection and cropping)
+      - Rectification (plate straightening)
+      - Segmentation (character extraction)
+      - OCR (character recognition)
 
     Args:
-        image_path (str): Path to the image file
-        bucket_name (str): Supabase storage bucket name
+        input_dir (str): Directory or path for the input image.
+        engine (ALPREngine): Engine holding the loaded models, reused across images.
+        camera_id (int): ID of the camera that captured the image, selecting its detection region.
 
     Returns:
-        str: URL of the uploaded image
+        str: The recognized license plate text, None if no plate was read.
+
+    Raises:
+        ModelServerError: The model server could not recognize the image; it should be retried.
+        Exception: Any other failure of the pipeline. The image must not be marked processed.
     """
-    try:
-        # Generate a unique file name
-        file_name = f"{uuid.uuid4()}{os.path.splitext(image_path)[1]}"
+    result = engine.recognize(input_dir, camera_id)
 
-        # Read the file
-        with open(image_path, "rb") as f:
-            file_data = f.read()
+    log("TOP", "-----------------------------------------------\n")
+    return result.license_plate
 
-        # Upload to Supabase
-        response = supabase.storage.from_(bucket_name).upload(
-            file_name, file_data, {"content-type": "image/jpeg"}
-        )
 
-        # Get the public URL
-        file_url = supabase.storage.from_(bucket_name).get_public_url(file_name)
+def store_result(writer, events, image_file, src_path, license_plate, camera_id=1):
+    """
+    Hands the image and the recognized license plate to the background writer, logging
+    failed reads. The upload and database insert happen off the recognition loop, and
+    repeated reads of the same plate are collapsed into one event.
 
-        log("TOP", f"Image uploaded to Supabase: {file_url}")
-        return file_url
+    Args:
+        writer (SupabaseWriter): Writer uploading the image and inserting the event.
+        events (EventDeduplicator): Deduplicator for repeated reads of the same plate.
+        image_file (str): Name of the image file.
+        src_path (str): Path of the original image in the pics folder.
+        license_plate (str): The recognized license plate, None or empty if none was read.
+        camera_id (int): ID of the camera that captured the image.
 
-    except Exception as e:
-        log("TOP", f"Error uploading to Supabase: {str(e)}")
-        return None
+    Returns:
+        Future or None: The pending write of the event, None if there is nothing to write.
+    """
+    if license_plate:
+        log("TOP", f"Result for {image_file}: {license_plate}")
+        if events.should_write(license_plate, camera_id):
+            return writer.submit(src_path, license_plate, camera_id)
+        log("TOP", f"{license_plate} was already recorded recently, skipping the event.")
+        metrics.count("alpr_events_total", "OccupancyEvents by outcome.", outcome="suppressed")
+    else:
+        log("TOP", f"No license plate read in {image_file}")
+    return None
 
 
-def save_to_database(license_plate, image_url, camera_id=1):
+def record_processed(ledger, write, src_path, license_plate, content_hash):
     """
-    Saves the license plate data to the OccupancyEvent table.
+    Marks an image as processed once its result is safe: right away when there is nothing to
+    write, otherwise when the write succeeds. An event the writer gave up on, or one still
+    pending when the process dies, leaves the image unrecorded, so it is processed again
+    after a restart.
 
     Args:
-        license_plate (str): The detected license plate
-        image_url (str): URL of the uploaded image
-        camera_id (int): ID of the camera that captured the image
+        ledger (ProcessedLedger): Ledger of the images already processed.
+        write (Future or None): The pending write returned by store_result().
+        src_path (str): Path of the original image in the pics folder.
+        license_plate (str): The recognized license plate, None if none was read.
+        content_hash (str): Content hash of the image.
+    """
+    if write is None:
+        ledger.record(src_path, license_plate, content_hash)
+        return
+
+    def written(future):
+        if future.exception() is None:
+            ledger.record(src_path, license_plate, content_hash)
+        else:
+            log("TOP", f"{os.path.basename(src_path)} was not stored, leaving it unprocessed: {future.exception()}")
+
+    write.add_done_callback(written)
+
+
+def check_processed(ledger, src_path, in_flight_hashes=()):
+    """
+    Checks whether an image was already processed, logging the skip. Unchanged files, such as
+    the ones left in the pics folder by a restart, are matched by name, size and modification
+    time without reading them; the others are hashed and matched by content.
+
+    Args:
+        ledger (ProcessedLedger): Ledger of the images already processed.
+        src_path (str): Path of the image.
+        in_flight_hashes (collection): Content hashes of the images being processed.
 
     Returns:
-        bool: Success status
+        tuple: (True, None) if the image can be skipped, else (False, its content hash).
     """
-    try:
-        # Insert into the OccupancyEvent table
-        data = {
-            "license_plate": license_plate,
-            "status": "Unprocessed",
-            "cameraId": camera_id,
-            "image": image_url,
-        }
-
-        response = supabase.table("OccupancyEvent").insert(data).execute()
-        log("TOP", f"Data saved to database: {license_plate}")
-        log("TOP", f"Response from supabase: {response}")
-        return True
+    if not ledger.contains_unchanged(src_path):
+        content_hash = hash_file(src_path)
+        if content_hash not in in_flight_hashes and not ledger.contains(src_path, content_hash):
+            return False, content_hash
+    log("TOP", f"Skipping {os.path.basename(src_path)}, already processed.")
+    metrics.count("alpr_skipped_images_total", "Images skipped before recognition.", reason="processed")
+    return True, None
 
-    except Exception as e:
-        log("TOP", f"Error saving to database: {str(e)}")
-        return False
-
-
-def process_images(
-    input_dir,
-    localisation_model,
-    segmentation_model,
-    sr_model,
-    ocr_model,
-    session_number=0,
-    cropped_paddings=[-5, -10, 0, 10, 20],
-):
+
+def is_repeated_frame(frames, src_path, camera_id=1, region=None):
     """
-    Processes images using the ALPR pipeline by performing:
-      - Localisation (plate detection and cropping)
-      - Rectification (plate straightening)
-      - Segmentation (character extraction)
-      - OCR (character recognition)
+    Checks whether an image repeats a recent capture of the same camera, before any model runs.
 
     Args:
-        input_dir (str): Directory or path for the input image.
-        localisation_model (str): Path to the localisation YOLO model.
-        segmentation_model (str): Path to the segmentation YOLO model.
-        sr_model (str): Path to the super resolution model used in rectification.
-        ocr_model (str): Path to the OCR Keras model.
-        session_number (int): Identifier for the processing session.
+        frames (FrameDeduplicator): Deduplicator holding the recent frames.
+        src_path (str): Path of the image.
+        camera_id (int): ID of the camera that captured the image.
+        region (CameraRegion, optional): The camera's detection region, the only part compared.
 
     Returns:
-        str: The recognized license plate text.
+        bool: True if the image can be skipped.
     """
-    try:
-        # Instantiate ALPR components
-        tm = test_manager()
-        upscaler_ = Upscaler(sr_model)
-        localiser = Localisation(localisation_model)
-        rectifier = Rectification(upscaler_, tm)
-        segmenter = Segmentation(segmentation_model, upscaler_)
-        # ocr_engine = OCR(ocr_model)
-
-        # Directories for intermediate outputs
-        cropped_dir = f"./output/cropped/session_{session_number}"
-        rectified_dir = f"./output/rectified/session_{session_number}"
-        segmented_dir = f"./output/segmented/session_{session_number}"
-
-        # Create required directories
-        os.makedirs(cropped_dir, exist_ok=True)
-        os.makedirs(rectified_dir, exist_ok=True)
-        os.makedirs(segmented_dir, exist_ok=True)
-
-        # --- Localisation: Crop license plates from the input image(s) ---
-        log("TOP", f"Beginning localisation for input image at {input_dir}")
-
-        localiser.set_directories(input_dir, cropped_dir)
-
-        cropped_directories = localiser.crop_license_plate(
-            padding_levels=cropped_paddings
-        )
+    frame_hash = dhash_file(src_path, region=region)
+    if frame_hash is not None and frames.is_duplicate(frame_hash, camera_id):
+        log("TOP", f"Skipping {os.path.basename(src_path)}, same scene as a recent capture.")
+        metrics.count("alpr_skipped_images_total", "Images skipped before recognition.", reason="repeated_frame")
+        return True
+    return False
 
-        log("TOP", "Post Localisation Report!")
-        log("TOP", f"Cropped Directories: {cropped_directories}")
 
-        # --- Rectification: Straighten each cropped license plate image ---
-        rectifier.set_directories(cropped_directories, rectified_dir)
-        score = rectifier.rectify()
+def record_queue_depth(watcher, in_flight=None):
+    """
+    Publishes the number of images waiting in the watcher queue and, with workers, in the pool.
+    """
+    metrics.set_gauge("alpr_queue_depth", watcher.queue.qsize(), "Images waiting to be processed.", queue="watcher")
+    if in_flight is not None:
+        metrics.set_gauge("alpr_queue_depth", in_flight, "Images waiting to be processed.", queue="workers")
 
-        # --- Segmentation : Segment each character ---
-        segmenter.set_directories(
-            cropped_dir=cropped_directories,
-            rectified_dir=rectified_dir,
-            output_dir=segmented_dir,
-        )
-        license_plate = segmenter.segment()
 
-        # Optionally clear intermediate folders after processing
-        for crop_dir in cropped_directories:
-            ensure_and_clear_folder(crop_dir)
-        ensure_and_clear_folder(rectified_dir)
-        ensure_and_clear_folder(segmented_dir)
+def process_images_with_workers(watcher, writer, ledger, frames, events, engine_kwargs, workers, max_queued=None):
+    """
+    Recognizes images from the watcher on a pool of worker processes.
 
-        log("TOP", "Cleared all the folders, proceeding with next step.")
-        log("TOP", "-----------------------------------------------\n")
-        return license_plate
+    Each worker loads the models once; this process stays the single writer for uploads and
+    database inserts, which the SupabaseWriter batches in the background. When the queue is full, new images wait in the watcher (backpressure).
+    On Ctrl+C the workers finish the frames already queued before stopping.
 
-    except Exception as e:
-        log("TOP", f"Error in processing thread: {str(e)}")
-        return None
+    Args:
+        watcher (ImageWatcher): Started watcher providing new image paths.
+        writer (SupabaseWriter): Writer uploading the results.
+        ledger (ProcessedLedger): Ledger of the images already processed.
+        frames (FrameDeduplicator): Deduplicator for repeated captures of the same scene.
+        events (EventDeduplicator): Deduplicator for repeated reads of the same plate.
+        engine_kwargs (dict): Keyword arguments for the ALPREngine in each worker.
+        workers (int): Number of worker processes.
+        max_queued (int, optional): Capacity of the shared frame queue.
+    """
+    pool = WorkerPool(engine_kwargs, workers=workers, max_queued=max_queued).start()
+    region = find_region(load_camera_regions(engine_kwargs.get("camera_regions")), 1)
+    # Content hashes of the images queued to the workers and not finished yet
+    in_flight = {}
+
+    def drain(results):
+        for src_path, result, error in results:
+            content_hash = in_flight.pop(src_path, None)
+            if error:
+                # Not recorded, so the image is processed again after a restart
+                log("TOP", f"Error processing {src_path}: {error}")
+                continue
+            write = store_result(writer, events, os.path.basename(src_path), src_path, result.license_plate)
+            if os.path.exists(src_path):
+                record_processed(ledger, write, src_path, result.license_plate, content_hash)
+
+    global running
+    try:
+        src_path = None
+        while running:
+            result = pool.get_result(timeout=0)
+            if result is not None:
+                drain([result])
+                continue
+
+            if src_path is None:
+                src_path = watcher.get(timeout=0.2)
+                record_queue_depth(watcher, len(in_flight))
+                if src_path is None or src_path in in_flight or not os.path.exists(src_path):
+                    src_path = None
+                    continue
+                processed, content_hash = check_processed(ledger, src_path, set(in_flight.values()))
+                if processed:
+                    src_path = None
+                    continue
+                if is_repeated_frame(frames, src_path, region=region):
+                    ledger.record(src_path, None, content_hash)
+                    src_path = None
+                    continue
+
+            # Backpressure: keep the image until a worker frees a slot in the queue
+            if pool.submit(src_path, timeout=0.2, camera_id=1):
+                log("TOP", f"Queued {os.path.basename(src_path)} for processing.")
+                in_flight[src_path] = content_hash
+                src_path = None
+    finally:
+        log("TOP", "Waiting for workers to finish queued images...")
+        drain(pool.stop())
 
 
 def process_images_continuously(
@@ -221,9 +279,11 @@ def process_images_continuously(
     segmentation_model="./models/segmentation_model.pt",
     sr_model="./models/LapSRN_x2.pb",
     ocr_model="./models/ocr_model.h5",
+    workers=1,
+    config=None,
 ):
     """
-    Continuously monitors the pics folder and processes new images.
+    Continuously monitors the pics folder and processes new images as they land.
 
     Args:
         pics_folder (str): Directory containing source images.
@@ -232,6 +292,8 @@ def process_images_continuously(
         segmentation_model (str): Path to the segmentation model weights.
         sr_model (str): Path to the super resolution model.
         ocr_model (str): Path to the OCR model.
+        workers (int): Number of worker processes; 1 processes images in this process.
+        config (str, optional): Engine config file, e.g. one written by benchmarks/autotune.py.
     """
     # Clear directories for a fresh start
     ensure_and_clear_folder(input_folder)
@@ -239,28 +301,86 @@ def process_images_continuously(
     ensure_and_clear_folder("./output/segmented/session_0/")
     ensure_and_clear_folder("./output/rectified/session_0/")
 
-    # Set to keep track of processed images
-    processed_images = set()
+    # New images are dispatched as soon as pic_capture closes them
+    watcher = ImageWatcher(pics_folder).start()
 
-    global running
-    while running:
+    # Uploads and inserts run in the background, batched and retried
+    writer = SupabaseWriter(supabase)
+
+    # Images processed before a restart are remembered on disk
+    ledger = ProcessedLedger()
+
+    # A parked car keeps triggering captures; skip repeated frames and events
+    frames = FrameDeduplicator()
+    events = EventDeduplicator()
+
+    # Stage latencies, counters and queue depth, for Prometheus or as a JSON snapshot
+    exporter = metrics.MetricsExporter(
+        metrics.REGISTRY, os.getenv("ALPR_METRICS_FILE"), os.getenv("ALPR_METRICS_JSON")
+    ).start()
+
+    engine_kwargs = {
+        "localisation_model": localisation_model,
+        "segmentation_model": segmentation_model,
+        "sr_model": sr_model,
+    }
+    if config:
+        engine_kwargs = dict(load_engine_config(config), **engine_kwargs)
+
+    if workers > 1:
         try:
-            # Get all image files in the pics folder
-            valid_extensions = (".jpg", ".jpeg", ".png", ".bmp")
-            image_files = [
-                f
-                for f in os.listdir(pics_folder)
-                if f.lower().endswith(valid_extensions) and f not in processed_images
-            ]
-
-            if not image_files:
-                log("TOP", "No new images to process. Waiting...")
-                time.sleep(1)  # Wait before checking again
-                continue
+            process_images_with_workers(watcher, writer, ledger, frames, events, engine_kwargs, workers)
+        finally:
+            log_dedupe_stats(frames, events)
+            watcher.stop()
+            writer.stop()
+            ledger.close()
+            exporter.stop()
+        return
+
+    model_server = os.getenv("ALPR_MODEL_SERVER")
+    if model_server:
+        # The models live in the local model server, shared with the other camera processes;
+        # the client connects again by itself after an outage
+        engine = ModelClient(model_server)
+        log("TOP", f"Recognizing through the model server at {model_server}.")
+    else:
+        # Load every model once and reuse the engine for the life of the process
+        engine = ALPREngine(**engine_kwargs)
 
-            # Process each new image
-            for image_file in image_files:
-                src_path = os.path.join(pics_folder, image_file)
+    # Repeated captures are compared on the part of the frame the detector looks at
+    region = find_region(load_camera_regions(engine_kwargs.get("camera_regions")), 1)
+
+    # Image to try again, with its content hash, after the model server failed it
+    retry = None
+    backoff = SERVER_BACKOFF
+
+    global running
+    try:
+        while running:
+            try:
+                if retry is not None:
+                    # Already checked against the ledger and the recent frames
+                    src_path, content_hash = retry
+                    retry = None
+                    image_file = os.path.basename(src_path)
+                    if not os.path.exists(src_path):
+                        continue
+                else:
+                    src_path = watcher.get(timeout=1)
+                    record_queue_depth(watcher)
+                    if src_path is None:
+                        continue
+
+                    image_file = os.path.basename(src_path)
+                    if not os.path.exists(src_path):
+                        continue
+                    processed, content_hash = check_processed(ledger, src_path)
+                    if processed:
+                        continue
+                    if is_repeated_frame(frames, src_path, region=region):
+                        ledger.record(src_path, None, content_hash)
+                        continue
                 dst_path = os.path.join(input_folder, image_file)
 
                 # Copy image from pics_folder to input_folder
@@ -269,39 +389,41 @@ def process_images_continuously(
                 log("TOP", f"Processing {image_file}...")
 
                 # Process the current image
-                license_plate = process_images(
-                    dst_path,
-                    localisation_model,
-                    segmentation_model,
-                    sr_model,
-                    ocr_model,
-                )
-
-                if license_plate:
-                    log("TOP", f"Result for {image_file}: {license_plate}")
-
-                    # Upload the image to Supabase storage
-                    image_url = upload_to_supabase(src_path)
-
-                    if image_url:
-                        # Save the result to the database
-                        save_to_database(license_plate, image_url)
-                else:
-                    log("TOP", f"Failed to process {image_file}")
-
-                # Mark as processed
-                processed_images.add(image_file)
+                try:
+                    license_plate = process_images(dst_path, engine)
+                except ModelServerError as e:
+                    # Not recorded, so the image is tried again once the server is back
+                    log("TOP", f"Model server unavailable ({e}), retrying {image_file} in {backoff:.0f}s.")
+                    retry = (src_path, content_hash)
+                    ensure_and_clear_folder(input_folder)
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, MAX_SERVER_BACKOFF)
+                    continue
+                except Exception as e:
+                    log("TOP", f"Error processing {image_file}, leaving it unprocessed: {str(e)}")
+                    ensure_and_clear_folder(input_folder)
+                    continue
+                backoff = SERVER_BACKOFF
+
+                write = store_result(writer, events, image_file, src_path, license_plate)
+
+                # Mark as processed, once the event is stored
+                record_processed(ledger, write, src_path, license_plate, content_hash)
 
                 # Clear the input folder for the next image
                 ensure_and_clear_folder(input_folder)
 
-            # Prevent the set from growing too large - keep the last 1000 processed images
-            if len(processed_images) > 1000:
-                processed_images = set(list(processed_images)[-1000:])
-
-        except Exception as e:
-            log("TOP", f"Error in continuous processing: {str(e)}")
-            time.sleep(10)  # Wait a bit longer after an error
+            except Exception as e:
+                log("TOP", f"Error in continuous processing: {str(e)}")
+                time.sleep(10)  # Wait a bit longer after an error
+    finally:
+        log_dedupe_stats(frames, events)
+        watcher.stop()
+        log("TOP", "Flushing pending database writes...")
+        writer.stop()
+        ledger.close()
+        exporter.stop()
+        engine.close()
 
 
 def main():
@@ -311,17 +433,24 @@ def main():
     # Register the signal handler for Ctrl+C
     signal.signal(signal.SIGINT, signal_handler)
 
+    # Log records are written by a background thread so slow output never stalls the loop
+    configure_logging(filename=os.getenv("ALPR_LOG_FILE"), use_queue=True)
+
     starter_log()
     log("TOP", "Starting continuous image processing. Press Ctrl+C to stop.")
 
     try:
-        process_images_continuously()
+        process_images_continuously(
+            workers=int(os.getenv("ALPR_WORKERS", "1")),
+            config=os.getenv("ALPR_CONFIG"),
+        )
     except KeyboardInterrupt:
         log("TOP", "Exiting due to user interrupt.")
     except Exception as e:
         log("TOP", f"Unhandled exception: {str(e)}")
     finally:
         log("TOP", "Image processing stopped.")
+        stop_logging()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,101 @@
+"""
+Export the YOLO models for the CPU backends and check them against the PyTorch path.
+
+Usage:
+    # ONNX export, plus an INT8 version calibrated on a folder of frames
+    python demo/detector_backends.py export ./models/localisation_model.pt --format onnx --int8 ./pics
+
+    # OpenVINO export
+    python demo/detector_backends.py export ./models/segmentation_model.pt --format openvino
+
+    # Compare an exported model with the PyTorch weights on a folder of images
+    python demo/detector_backends.py parity ./models/localisation_model.pt ./models/localisation_model.onnx --images ./demo/input
+"""
+import os
+import sys
+import json
+import argparse
+import cv2
+
+# Add the project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from alpr.backends import create_backend, parity_check, quantize_onnx
+from alpr.utils import log
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def load_images(folder, limit=None):
+    images = []
+    for file_name in sorted(os.listdir(folder)):
+        if file_name.lower().endswith(IMAGE_EXTENSIONS):
+            image = cv2.imread(os.path.join(folder, file_name))
+            if image is not None:
+                images.append(image)
+        if limit and len(images) >= limit:
+            break
+    return images
+
+
+def export(args):
+    from ultralytics import YOLO
+
+    exported = YOLO(args.model).export(format=args.format, imgsz=args.imgsz)
+    log("EXPORT", f"Exported {args.model} to {exported}")
+
+    if args.int8:
+        if args.format != "onnx":
+            sys.exit("--int8 calibration is only supported for ONNX exports.")
+        calibration = load_images(args.int8, limit=args.calibration_images)
+        if not calibration:
+            sys.exit(f"No calibration images found in {args.int8}")
+        output_path = os.path.splitext(exported)[0] + "_int8.onnx"
+        quantize_onnx(exported, output_path, calibration, (args.imgsz, args.imgsz))
+        log("EXPORT", f"Quantized model written to {output_path}")
+
+
+def parity(args):
+    images = load_images(args.images)
+    if not images:
+        sys.exit(f"No images found in {args.images}")
+    reference = create_backend(args.reference, "ultralytics")
+    candidate = create_backend(args.candidate, args.backend)
+    report = parity_check(reference, candidate, images, args.confidence, args.iou, args.match_iou)
+    print(json.dumps(report, indent=2))
+    if not report["parity"]:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and check the detector backends.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export PyTorch weights for a CPU backend.")
+    export_parser.add_argument("model", help="Path to the .pt weights.")
+    export_parser.add_argument("--format", choices=["onnx", "openvino"], default="onnx")
+    export_parser.add_argument("--imgsz", type=int, default=640, help="Network input size.")
+    export_parser.add_argument("--int8", metavar="FOLDER", default=None,
+                               help="Also write an INT8 ONNX model calibrated on the images in FOLDER.")
+    export_parser.add_argument("--calibration-images", type=int, default=100,
+                               help="Maximum number of calibration images.")
+    export_parser.set_defaults(handler=export)
+
+    parity_parser = subparsers.add_parser("parity", help="Compare an exported model with the PyTorch path.")
+    parity_parser.add_argument("reference", help="Path to the .pt weights.")
+    parity_parser.add_argument("candidate", help="Path to the exported model.")
+    parity_parser.add_argument("--backend", default="auto", choices=["auto", "onnxruntime", "openvino"])
+    parity_parser.add_argument("--images", default="./demo/input", help="Folder of test images.")
+    parity_parser.add_argument("--confidence", type=float, default=0.25)
+    parity_parser.add_argument("--iou", type=float, default=0.7, help="NMS IoU threshold.")
+    parity_parser.add_argument("--match-iou", type=float, default=0.9,
+                               help="IoU above which two boxes count as the same detection.")
+    parity_parser.set_defaults(handler=parity)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
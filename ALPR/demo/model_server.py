@@ -0,0 +1,168 @@
+"""
+Run the local model server, or check it end to end with stub models.
+
+Usage:
+    # Host the models once for every camera process on this machine
+    python demo/model_server.py serve --socket /tmp/alpr-model-server.sock
+
+    # Camera processes then recognize through it, e.g.
+    ALPR_MODEL_SERVER=/tmp/alpr-model-server.sock python demo/alpr_top.py
+
+    # Start a stub server and hammer it from several client processes, no models needed
+    python demo/model_server.py smoke --clients 4 --frames 25
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+import tempfile
+import subprocess
+import multiprocessing as mp
+import numpy as np
+
+# Add the project root to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from alpr import metrics
+from alpr.engine import ALPREngine, load_engine_config
+from alpr.server import DEFAULT_SOCKET_PATH, ModelClient, ModelServer, ModelServerError, StubEngine
+from alpr.utils import configure_logging, log
+
+
+def serve(args):
+    if args.stub:
+        engine = StubEngine(args.stub_delay)
+    else:
+        engine_kwargs = {
+            "localisation_model": args.localisation_model,
+            "segmentation_model": args.segmentation_model,
+            "sr_model": args.sr_model,
+        }
+        if args.config:
+            engine_kwargs = dict(load_engine_config(args.config), **engine_kwargs)
+        engine = ALPREngine(**engine_kwargs)
+
+    server = ModelServer(engine, args.socket, args.max_batch, args.max_wait).start()
+    exporter = metrics.MetricsExporter(
+        metrics.REGISTRY, os.getenv("ALPR_METRICS_FILE"), os.getenv("ALPR_METRICS_JSON")
+    ).start()
+
+    stopped = []
+    signal.signal(signal.SIGINT, lambda sig, frame: stopped.append(sig))
+    signal.signal(signal.SIGTERM, lambda sig, frame: stopped.append(sig))
+    while not stopped:
+        time.sleep(0.5)
+    server.stop()
+    engine.close()
+    exporter.stop()
+
+
+def smoke_client(client_id, socket_path, frames, seed, failures, batch_sizes):
+    """
+    Send random frames of varying sizes and check the stub read each one back exactly.
+    """
+    rng = np.random.default_rng(seed + client_id)
+    with ModelClient(socket_path) as client:
+        for _ in range(frames):
+            height, width = int(rng.integers(120, 1080)), int(rng.integers(160, 1920))
+            frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+            try:
+                result = client.recognize(frame, camera_id=client_id)
+            except ModelServerError as e:
+                failures.put(f"client {client_id}: {e}")
+                continue
+            if result.license_plate != StubEngine.plate_for(frame):
+                failures.put(f"client {client_id}: read {result.license_plate}, "
+                             f"expected {StubEngine.plate_for(frame)}")
+            batch_sizes.put(result.batch_size)
+
+
+def start_stub_server(args, socket_path, timeout=30):
+    """
+    Run a stub server in its own interpreter, as the daemon would be, and wait for its socket.
+    """
+    server = subprocess.Popen([
+        sys.executable, os.path.abspath(__file__),
+        "--max-batch", str(args.max_batch), "--max-wait", str(args.max_wait), "--stub-delay", str(args.stub_delay),
+        "serve", "--stub", "--socket", socket_path,
+    ])
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(socket_path):
+        if server.poll() is not None or time.monotonic() > deadline:
+            server.kill()
+            sys.exit("The stub model server did not start.")
+        time.sleep(0.05)
+    return server
+
+
+def smoke(args):
+    socket_path = os.path.join(tempfile.mkdtemp(prefix="alpr_server_"), "server.sock")
+    server = start_stub_server(args, socket_path)
+
+    context = mp.get_context("spawn")
+    failures, batch_sizes = context.Queue(), context.Queue()
+    start = time.perf_counter()
+    clients = [
+        context.Process(target=smoke_client, args=(i, socket_path, args.frames, args.seed, failures, batch_sizes))
+        for i in range(args.clients)
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+    server.send_signal(signal.SIGTERM)
+    server.wait()
+
+    errors = []
+    while not failures.empty():
+        errors.append(failures.get())
+    sizes = []
+    while not batch_sizes.empty():
+        sizes.append(batch_sizes.get())
+
+    expected = args.clients * args.frames
+    log("SMOKE", f"{len(sizes)}/{expected} frames read in {elapsed:.2f}s, "
+                 f"mean batch {np.mean(sizes) if sizes else 0:.2f}, largest batch {max(sizes, default=0)}.")
+    for error in errors:
+        log("SMOKE", error)
+    if errors or len(sizes) != expected or any(client.exitcode for client in clients):
+        sys.exit(1)
+    if args.clients > 1 and max(sizes) < 2:
+        log("SMOKE", "No request was batched with another client's.")
+        sys.exit(1)
+    log("SMOKE", "Model server smoke check passed.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local ALPR model server.")
+    parser.add_argument("--max-batch", type=int, default=8, help="Most frames run in one batch.")
+    parser.add_argument("--max-wait", type=float, default=0.005,
+                        help="Seconds to wait for a batch to fill once a frame arrived.")
+    parser.add_argument("--stub-delay", type=float, default=0.02, help="Seconds each stub batch takes.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Host the models for the local camera processes.")
+    serve_parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="Unix domain socket path.")
+    serve_parser.add_argument("--stub", action="store_true", help="Answer with stub reads, no models.")
+    serve_parser.add_argument("--config", default=os.getenv("ALPR_CONFIG"), help="Engine config file.")
+    serve_parser.add_argument("--localisation-model", default="./models/localisation_model.pt")
+    serve_parser.add_argument("--segmentation-model", default="./models/segmentation_model.pt")
+    serve_parser.add_argument("--sr-model", default="./models/LapSRN_x2.pb")
+    serve_parser.set_defaults(handler=serve)
+
+    smoke_parser = subparsers.add_parser("smoke", help="Check a stub server with concurrent clients.")
+    smoke_parser.add_argument("--clients", type=int, default=4, help="Client processes.")
+    smoke_parser.add_argument("--frames", type=int, default=25, help="Frames sent by each client.")
+    smoke_parser.add_argument("--seed", type=int, default=0)
+    smoke_parser.set_defaults(handler=smoke)
+
+    args = parser.parse_args()
+    configure_logging(os.getenv("ALPR_LOG_LEVEL", "INFO"))
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()